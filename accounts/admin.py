@@ -6,6 +6,7 @@ from .models import CustomUser, DoctorAssignmentLog
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'user_type', 'specialization', 'verified', 'doctor_code', 'is_active')
     list_filter = ('user_type', 'verified', 'is_active')
+    actions = ('revoke_tokens',)
     fieldsets = UserAdmin.fieldsets + (
         ('Additional Info', {'fields': ('user_type', 'specialization', 'verified', 'doctor_code', 'assigned_doctor')}),
     )
@@ -13,6 +14,11 @@ class CustomUserAdmin(UserAdmin):
         ('Additional Info', {'fields': ('user_type', 'specialization', 'verified', 'doctor_code', 'assigned_doctor')}),
     )
 
+    @admin.action(description='Revoke issued tokens')
+    def revoke_tokens(self, request, queryset):
+        for user in queryset:
+            user.revoke_tokens()
+
 @admin.register(DoctorAssignmentLog)
 class DoctorAssignmentLogAdmin(admin.ModelAdmin):
     list_display = ('patient', 'doctor', 'source', 'created_at')
@@ -0,0 +1,126 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser
+
+
+class ClaimsRefreshToken(RefreshToken):
+    # Carries what views authorize on, so requests need no user lookup.
+    # Access tokens derived from it copy these claims.
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['user_type'] = user.user_type
+        token['doctor_id'] = user.assigned_doctor_id
+        token['is_staff'] = user.is_staff
+        token['token_version'] = user.token_version
+        return token
+
+
+class UserCache:
+    # Short-lived, per-process cache of token versions and full user rows.
+    # A revoked token keeps working for at most JWT_USER_CACHE_TTL seconds in
+    # processes that had already cached its user. Holds at most
+    # JWT_USER_CACHE_SIZE entries, dropping the least recently used.
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                return entry[0]
+        value = load()
+        with self.lock:
+            self.entries[key] = (value, now + settings.JWT_USER_CACHE_TTL)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.JWT_USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        return value
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(('version', user_id), None)
+            self.entries.pop(('user', user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+def token_version(user_id):
+    # None for unknown or inactive users, which never matches a token.
+    return user_cache.get(('version', user_id), lambda: CustomUser.objects.filter(
+        pk=user_id, is_active=True
+    ).values_list('token_version', flat=True).first())
+
+
+def get_full_user(user, fresh=False):
+    # The complete row for a token-backed user, served from the cache unless
+    # `fresh` is set, which callers that modify and save the row must use.
+    if not getattr(user, 'is_token_user', False):
+        return user
+    if fresh:
+        return CustomUser.objects.get(pk=user.pk)
+    cached = user_cache.get(('user', user.pk), lambda: CustomUser.objects.filter(pk=user.pk).first())
+    return copy.copy(cached)
+
+
+def token_user(validated_token):
+    user = CustomUser(
+        id=validated_token[api_settings.USER_ID_CLAIM],
+        username=validated_token.get('username', ''),
+        user_type=validated_token['user_type'],
+        assigned_doctor_id=validated_token.get('doctor_id'),
+        is_staff=validated_token.get('is_staff', False),
+        token_version=validated_token['token_version'],
+    )
+    # Behaves like a loaded row for filters and foreign keys, but holds only
+    # the claims, so it must never be saved.
+    user._state.adding = False
+    user._state.db = 'default'
+    user.is_token_user = True
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if 'token_version' not in validated_token:
+            # Issued before claims were added; fall back to a database lookup.
+            return super().get_user(validated_token)
+        if token_version(validated_token[api_settings.USER_ID_CLAIM]) != validated_token['token_version']:
+            raise AuthenticationFailed(_('Token has been revoked.'), code='token_revoked')
+        return token_user(validated_token)
+
+
+def authenticate_request(request, allow_query_token=False):
+    # For plain Django views (the async ones) that sit outside DRF's
+    # authentication. EventSource cannot set headers, so streams may pass
+    # the token as ?token=.
+    authenticator = StatelessJWTAuthentication()
+    header = authenticator.get_header(request)
+    raw_token = authenticator.get_raw_token(header) if header else None
+    if raw_token is None and allow_query_token:
+        raw_token = request.GET.get('token')
+    if not raw_token:
+        raise NotAuthenticated()
+    return authenticator.get_user(authenticator.get_validated_token(raw_token))
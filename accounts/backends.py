@@ -0,0 +1,23 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .hashers import check_password, make_password
+from .models import CustomUser
+
+
+class PooledHashingBackend(ModelBackend):
+    # ModelBackend with the password work moved onto the hashing pool.
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(CustomUser.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = CustomUser._default_manager.get_by_natural_key(username)
+        except CustomUser.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            make_password(password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
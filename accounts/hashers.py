@@ -0,0 +1,111 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # Django's PBKDF2 with the work factor taken from settings. Stored hashes
+    # with a different count are re-hashed on the next successful login, so
+    # changing PASSWORD_PBKDF2_ITERATIONS rolls out as users sign in.
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins in progress; try again shortly.'
+    default_code = 'hashing_busy'
+
+
+class HashingPool:
+    # Password hashing runs on a few dedicated threads, so a burst of logins
+    # can use at most that many cores (PBKDF2 releases the GIL) and the
+    # request threads stay free for everything else. Callers beyond the
+    # queue wait up to `timeout` for a slot and then get a 503.
+
+    def __init__(self, workers, queue, timeout, name='password-hash'):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix=name)
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.timeout = timeout
+
+    def run(self, func, *args):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise HashingBusy()
+        try:
+            future = self.executor.submit(self.call, func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        return future.result()
+
+    def map(self, func, items):
+        # For batches such as user imports: at most `workers` items are in
+        # flight at once, so the queue stays free for sign-ins.
+        pending, results = deque(), []
+        for item in items:
+            if len(pending) >= self.workers:
+                results.append(pending.popleft().result())
+            if not self.slots.acquire(timeout=self.timeout):
+                raise HashingBusy()
+            try:
+                pending.append(self.executor.submit(self.call, func, item))
+            except BaseException:
+                self.slots.release()
+                raise
+        results += [future.result() for future in pending]
+        return results
+
+    def call(self, func, *args):
+        # Frees the slot before the caller is woken, not after.
+        try:
+            return func(*args)
+        finally:
+            self.slots.release()
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def _shared_pool(name, *args):
+    if name not in _pools:
+        with _pool_lock:
+            if name not in _pools:
+                _pools[name] = HashingPool(*args, name=name)
+    return _pools[name]
+
+
+def get_pool():
+    return _shared_pool(
+        'password-hash', settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE, settings.PASSWORD_HASH_QUEUE_TIMEOUT
+    )
+
+
+def get_import_pool():
+    # User imports hash on threads of their own, so a large file neither
+    # takes the sign-in pool's slots nor has to wait for them.
+    return _shared_pool('import-hash', settings.USER_IMPORT_HASH_WORKERS, 0, None)
+
+
+def make_password(password):
+    return get_pool().run(hashers.make_password, password)
+
+
+def check_password(user, password):
+    # Verifies on the pool and, if the stored hash is outdated under the
+    # current PASSWORD_HASHERS policy, stores a fresh one. The save happens
+    # here, on the request thread and its database connection.
+    outdated = []
+    valid = get_pool().run(hashers.check_password, password, user.password, outdated.append)
+    if outdated:
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return valid
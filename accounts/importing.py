@@ -0,0 +1,261 @@
+import csv
+import io
+import itertools
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from reports.signals import bulk_changed
+from .hashers import get_import_pool
+from .models import CustomUser, DoctorAssignmentLog, allocate_doctor_codes
+from .serializers import ImportUserSerializer
+
+FORMATS = {
+    '.csv': 'csv', 'text/csv': 'csv',
+    '.ndjson': 'ndjson', '.jsonl': 'ndjson', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson',
+}
+# Errors beyond this many are counted but not listed.
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(name='', content_type=''):
+    extension = '.' + name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return FORMATS.get(extension) or FORMATS.get((content_type or '').split(';')[0].strip().lower())
+
+
+def read_rows(stream, format):
+    # Yields (line, row, error) from a binary stream without loading it
+    # whole. Empty CSV cells are dropped so optional fields get defaults.
+    # Malformed CSV records are reported by line; text that is not UTF-8
+    # ends the file with an error, since decoding cannot resume after it.
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    line = 0
+    try:
+        for line, row, error in (_csv_rows(text) if format == 'csv' else _ndjson_rows(text)):
+            yield line, row, error
+    except UnicodeDecodeError:
+        yield line + 1, None, {'non_field_errors': ['Not valid UTF-8 at or after this line; the rest was skipped.']}
+
+
+def _csv_rows(text):
+    reader = csv.DictReader(text)
+    while True:
+        start = reader.line_num + 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            # Reported on the line the broken record starts on.
+            yield start, None, {'non_field_errors': [f'Invalid CSV: {exc}.']}
+            continue
+        yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}, None
+
+
+def _ndjson_rows(text):
+    for line, raw in enumerate(text, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError:
+            yield line, None, {'non_field_errors': ['Invalid JSON.']}
+            continue
+        if not isinstance(row, dict):
+            yield line, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield line, row, None
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _hash_passwords(passwords):
+    # Only real passwords go to the pool; the rest are unusable, which costs
+    # nothing to generate.
+    hashed = iter(get_import_pool().map(make_password, [password for password in passwords if password]))
+    return [next(hashed) if password else make_password(None) for password in passwords]
+
+
+class UserImport:
+    # Validates rows chunk by chunk and inserts each valid chunk with a
+    # handful of queries: one username check, one doctor lookup, batched
+    # doctor-code allocation and a bulk_create per table. Password hashing,
+    # the expensive part, runs on a hashing pool of its own (PBKDF2 releases
+    # the GIL).
+
+    def __init__(self, chunk_size=None, dry_run=False):
+        self.chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+        self.dry_run = dry_run
+        # One serializer validates every row; building one per row costs
+        # more than the validation itself (its fields are deep-copied).
+        self.serializer = ImportUserSerializer()
+        self.seen = set()
+        # Doctors created by this import, by username, so later rows can
+        # refer to them before or without a doctor code.
+        self.doctors = {}
+        self.summary = {'rows': 0, 'created': 0, 'doctors': 0, 'patients': 0, 'assigned': 0, 'failed': 0, 'errors': []}
+
+    def error(self, line, errors):
+        self.summary['failed'] += 1
+        if len(self.summary['errors']) < MAX_REPORTED_ERRORS:
+            self.summary['errors'].append({'line': line, 'errors': errors})
+
+    def run(self, rows, log=None):
+        log = log or (lambda message: None)
+        for chunk in _chunks(rows, self.chunk_size):
+            self.import_chunk(chunk)
+            log(f"{self.summary['rows']} rows, {self.summary['created']} created, {self.summary['failed']} failed")
+        self.summary['errors'].sort(key=lambda error: error['line'])
+        return self.summary
+
+    def validate(self, chunk):
+        valid = []
+        for line, row, errors in chunk:
+            self.summary['rows'] += 1
+            if errors:
+                self.error(line, errors)
+                continue
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as exc:
+                self.error(line, as_serializer_error(exc))
+                continue
+            if data['username'] in self.seen:
+                self.error(line, {'username': ['Duplicate username in this file.']})
+                continue
+            self.seen.add(data['username'])
+            valid.append((line, data))
+        return self.without_taken(valid)
+
+    def without_taken(self, rows):
+        taken = set(CustomUser.objects.filter(
+            username__in=[data['username'] for _, data in rows]
+        ).values_list('username', flat=True))
+        kept = []
+        for line, data in rows:
+            if data['username'] in taken:
+                self.error(line, {'username': ['A user with that username already exists.']})
+            else:
+                kept.append((line, data))
+        return kept
+
+    def resolve_doctors(self, patients, known):
+        # Returns the patients whose doctor was found, with its id, and
+        # (line, errors) for the rest. `known` maps the usernames of doctors
+        # created by this import to their ids.
+        codes = {data['doctor_code'].upper() for _, data in patients if data['doctor_code']}
+        usernames = {
+            data['doctor_username'] for _, data in patients
+            if data['doctor_username'] and data['doctor_username'] not in known
+        }
+        by_code, by_username = {}, {}
+        if codes or usernames:
+            found = CustomUser.objects.filter(user_type='doctor').filter(
+                Q(doctor_code__in=codes) | Q(username__in=usernames)
+            ).values_list('id', 'username', 'doctor_code')
+            for doctor_id, username, code in found:
+                by_code[code] = doctor_id
+                by_username[username] = doctor_id
+
+        resolved, failures = [], []
+        for line, data in patients:
+            doctor_id = None
+            if data['doctor_code']:
+                doctor_id = by_code.get(data['doctor_code'].upper())
+                if doctor_id is None:
+                    failures.append((line, {'doctor_code': ['No doctor with this code.']}))
+                    continue
+            elif data['doctor_username']:
+                username = data['doctor_username']
+                if username in known:
+                    doctor_id = known[username]
+                elif username in by_username:
+                    doctor_id = by_username[username]
+                else:
+                    failures.append((line, {'doctor_username': ['No doctor with this username.']}))
+                    continue
+            resolved.append((line, data, doctor_id))
+        return resolved, failures
+
+    def build(self, data, password, **extra):
+        return CustomUser(
+            username=data['username'], email=data['email'], password=password, user_type=data['user_type'],
+            first_name=data['first_name'], last_name=data['last_name'], specialization=data['specialization'],
+            verified=data['verified'], phone_number=data['phone_number'], date_of_birth=data['date_of_birth'],
+            address=data['address'], **extra
+        )
+
+    def import_chunk(self, chunk):
+        rows = self.validate(chunk)
+        if self.dry_run:
+            # Nothing is inserted, but later rows may still refer to these.
+            doctors = [data for _, data in rows if data['user_type'] == 'doctor']
+            self.doctors.update((data['username'], None) for data in doctors)
+            patients, failures = self.resolve_doctors([row for row in rows if row[1]['user_type'] != 'doctor'], self.doctors)
+            self.finish(doctors, patients, failures)
+            return
+
+        # Hash before opening the transaction so it is not held for the
+        # slowest part of the chunk.
+        passwords = dict(zip(
+            [data['username'] for _, data in rows],
+            _hash_passwords([data['password'] for _, data in rows]),
+        ))
+        try:
+            self.finish(*self.insert(rows, passwords))
+        except IntegrityError:
+            # A user registered one of these usernames after validate()
+            # checked them. Report those rows and insert the others.
+            rows = self.without_taken(rows)
+            try:
+                self.finish(*self.insert(rows, passwords))
+            except IntegrityError:
+                for line, _ in rows:
+                    self.error(line, {'non_field_errors': ['Conflicted with a concurrent change; import it again.']})
+
+    def insert(self, rows, passwords):
+        doctors = [data for _, data in rows if data['user_type'] == 'doctor']
+        with transaction.atomic():
+            codes = allocate_doctor_codes(len(doctors))
+            created = CustomUser.objects.bulk_create([
+                self.build(data, passwords[data['username']], doctor_code=code) for data, code in zip(doctors, codes)
+            ])
+            known = {**self.doctors, **{user.username: user.pk for user in created}}
+
+            patients, failures = self.resolve_doctors([row for row in rows if row[1]['user_type'] != 'doctor'], known)
+            created += CustomUser.objects.bulk_create([
+                self.build(data, passwords[data['username']], assigned_doctor_id=doctor_id)
+                for _, data, doctor_id in patients
+            ])
+            DoctorAssignmentLog.objects.bulk_create([
+                DoctorAssignmentLog(patient_id=user.pk, doctor_id=user.assigned_doctor_id, source='import')
+                for user in created if user.assigned_doctor_id
+            ])
+            if created:
+                bulk_changed.send(sender=CustomUser, ids=[user.pk for user in created])
+        # Only committed doctors can be referred to by later chunks.
+        self.doctors = known
+        return doctors, patients, failures
+
+    def finish(self, doctors, patients, failures):
+        for line, errors in failures:
+            self.error(line, errors)
+        self.count(len(doctors), patients)
+
+    def count(self, doctors, patients):
+        self.summary['doctors'] += doctors
+        self.summary['patients'] += len(patients)
+        self.summary['created'] += doctors + len(patients)
+        self.summary['assigned'] += sum(1 for _, data, _ in patients if data['doctor_code'] or data['doctor_username'])
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importing import UserImport, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Create doctors and patients from a CSV or NDJSON file (one user per row/line). Doctors get '
+        'generated doctor codes; patients are linked through a doctor_code or doctor_username column.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=('csv', 'ndjson'), help='Default: from the file extension.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per batch (default: USER_IMPORT_CHUNK_SIZE).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; create nothing.')
+
+    def handle(self, *args, **options):
+        format = options['format'] or detect_format(options['path'])
+        if format is None:
+            raise CommandError('Cannot tell the file format; pass --format csv or --format ndjson.')
+        importer = UserImport(options['chunk_size'], dry_run=options['dry_run'])
+        log = lambda message: self.stdout.write(message)
+        if options['path'] == '-':
+            summary = importer.run(read_rows(sys.stdin.buffer, format), log=log)
+        else:
+            try:
+                with open(options['path'], 'rb') as stream:
+                    summary = importer.run(read_rows(stream, format), log=log)
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {options['path']}")
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {dict(error['errors'])}")
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['created']} user(s): {summary['doctors']} doctor(s), {summary['patients']} patient(s), "
+            f"{summary['assigned']} assigned; {summary['failed']} row(s) failed."
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_assigned_doctor_customuser_doctor_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['assigned_doctor', '-date_joined', '-id'], name='user_assigned_doctor_joined'),
+        ),
+    ]
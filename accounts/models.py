@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+
+from leukemia_detection.mixins import LoadedValuesMixin
 import secrets
 import string
 
@@ -7,7 +9,17 @@ def generate_doctor_code(length=8):
     alphabet = string.ascii_uppercase + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-class CustomUser(AbstractUser):
+def allocate_doctor_codes(count):
+    # Draw codes in bulk and check them against the table with one query per
+    # round instead of one query per code.
+    codes = set()
+    while len(codes) < count:
+        candidates = {generate_doctor_code() for _ in range(count - len(codes))} - codes
+        taken = set(CustomUser.objects.filter(doctor_code__in=candidates).values_list('doctor_code', flat=True))
+        codes |= candidates - taken
+    return list(codes)
+
+class CustomUser(LoadedValuesMixin, AbstractUser):
     USER_TYPES = [
         ('doctor', 'Doctor'),
         ('user', 'User'),
@@ -20,13 +32,28 @@ class CustomUser(AbstractUser):
     address = models.TextField(blank=True, null=True)
     doctor_code = models.CharField(max_length=10, unique=True, null=True, blank=True)
     assigned_doctor = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='patients')
+    token_version = models.PositiveIntegerField(default=0)
+
+    tracked_fields = ('assigned_doctor_id', 'first_name', 'last_name', 'username', 'email')
+
+    class Meta(AbstractUser.Meta):
+        swappable = 'AUTH_USER_MODEL'
+        indexes = [
+            models.Index(fields=['assigned_doctor', '-date_joined', '-id'], name='user_assigned_doctor_joined'),
+        ]
+
+    def revoke_tokens(self):
+        # Every token issued before this call stops authenticating.
+        from .authentication import user_cache
+        CustomUser.objects.filter(pk=self.pk).update(token_version=models.F('token_version') + 1)
+        user_cache.forget(self.pk)
+        self.refresh_from_db(fields=['token_version'])
 
     def save(self, *args, **kwargs):
+        if getattr(self, 'is_token_user', False):
+            raise RuntimeError("Token-backed users hold only token claims; load the full row before saving.")
         if self.user_type == 'doctor' and not self.doctor_code:
-            code = generate_doctor_code()
-            while CustomUser.objects.filter(doctor_code=code).exists():
-                code = generate_doctor_code()
-            self.doctor_code = code
+            self.doctor_code = allocate_doctor_codes(1)[0]
         super().save(*args, **kwargs)
 
 class DoctorAssignmentLog(models.Model):
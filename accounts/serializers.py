@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from .hashers import make_password
 from .models import CustomUser
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -10,10 +12,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ('username', 'email', 'password', 'user_type', 'specialization', 'phone_number', 'date_of_birth', 'address')
 
     def create(self, validated_data):
-        user = CustomUser.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        # Hashed on the shared pool rather than the request thread.
+        user = CustomUser.objects.create(
+            username=CustomUser.normalize_username(validated_data['username']),
+            email=CustomUser.objects.normalize_email(validated_data['email']),
+            password=make_password(validated_data['password']),
             user_type=validated_data['user_type'],
             specialization=validated_data.get('specialization', ''),
             phone_number=validated_data.get('phone_number', ''),
@@ -49,5 +52,36 @@ class UserSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ('id', 'username', 'email', 'user_type', 'specialization', 'verified', 'phone_number', 'date_of_birth', 'address', 'doctor_code', 'assigned_doctor')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('assigned_doctor').only(
+            'id', 'username', 'email', 'user_type', 'specialization', 'verified', 'phone_number', 'date_of_birth',
+            'address', 'doctor_code', 'date_joined', 'assigned_doctor', 'assigned_doctor__username',
+            'assigned_doctor__first_name', 'assigned_doctor__last_name', 'assigned_doctor__specialization',
+            'assigned_doctor__verified'
+        )
+
 class DoctorCodeLinkSerializer(serializers.Serializer):
     doctor_code = serializers.CharField(max_length=12)
+
+class ImportUserSerializer(serializers.Serializer):
+    # One row of a bulk import. Uniqueness and doctor references are checked
+    # per chunk by accounts.importing, not per row.
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    password = serializers.CharField(required=False, allow_blank=True, default='')
+    user_type = serializers.ChoiceField(choices=CustomUser.USER_TYPES, default='user')
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    specialization = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    verified = serializers.BooleanField(required=False, default=False)
+    phone_number = serializers.CharField(max_length=15, required=False, allow_blank=True, default='')
+    date_of_birth = serializers.DateField(required=False, allow_null=True, default=None)
+    address = serializers.CharField(required=False, allow_blank=True, default='')
+    doctor_code = serializers.CharField(max_length=12, required=False, allow_blank=True, default='')
+    doctor_username = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if data['user_type'] == 'doctor' and (data['doctor_code'] or data['doctor_username']):
+            raise serializers.ValidationError('Only patients can be assigned to a doctor.')
+        return data
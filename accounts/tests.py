@@ -1,7 +1,22 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts import importing
+from accounts.authentication import UserCache, user_cache
+from accounts.hashers import HashingBusy, HashingPool
 from accounts.models import DoctorAssignmentLog
 
 User = get_user_model()
@@ -42,6 +57,7 @@ class DoctorCodeTestCase(TestCase):
 
 class LinkDoctorAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.doctor = User.objects.create_user(
             username='doctor1',
             email='doctor@example.com',
@@ -83,8 +99,8 @@ class LinkDoctorAPITestCase(APITestCase):
         self.client.force_authenticate(user=self.doctor)
         response = self.client.get('/api/doctor/patients/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['username'], self.patient.username)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['username'], self.patient.username)
 
     def test_remove_patient(self):
         self.patient.assigned_doctor = self.doctor
@@ -99,3 +115,279 @@ class LinkDoctorAPITestCase(APITestCase):
             doctor=self.doctor,
             source='doctor_removal'
         ).exists())
+
+    def test_doctor_patients_query_budget(self):
+        User.objects.bulk_create(
+            User(username=f'patient{i}', user_type='user', assigned_doctor=self.doctor)
+            for i in range(2, 80)
+        )
+        self.client.force_authenticate(user=self.doctor)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/doctor/patients/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['assigned_doctor']['id'], self.doctor.id)
+
+class StatelessJWTTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.doctor = User.objects.create_user(
+            username='doctor1',
+            email='doctor@example.com',
+            password='pass123',
+            user_type='doctor'
+        )
+        self.patient = User.objects.create_user(
+            username='patient1',
+            email='patient@example.com',
+            password='pass123',
+            user_type='user'
+        )
+
+    def login(self, username):
+        self.client.credentials()
+        response = self.client.post('/api/login/', {'username': username, 'password': 'pass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response
+
+    def test_authorizes_from_claims_without_user_lookup(self):
+        self.login('doctor1')
+        self.client.get('/api/doctor-report-stats/')
+        # Only the stats query itself; the token version is cached.
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/doctor-report-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bumping_token_version_revokes(self):
+        self.login('doctor1')
+        self.assertEqual(self.client.get('/api/doctor/patients/').status_code, status.HTTP_200_OK)
+        self.doctor.revoke_tokens()
+        response = self.client.get('/api/doctor/patients/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.login('doctor1')
+        self.assertEqual(self.client.get('/api/doctor/patients/').status_code, status.HTTP_200_OK)
+
+    def test_removing_patient_revokes_their_tokens(self):
+        self.patient.assigned_doctor = self.doctor
+        self.patient.save()
+        access = self.login('patient1').data['access']
+        self.login('doctor1')
+        self.assertEqual(self.client.delete(f'/api/doctor/patients/{self.patient.id}/remove/').status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/user/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_USER_CACHE_SIZE=2)
+    def test_user_cache_drops_least_recently_used(self):
+        cache = UserCache()
+        for key in ('a', 'b'):
+            cache.get(key, lambda: key)
+        cache.get('a', lambda: 'reloaded')
+        cache.get('c', lambda: 'c')
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(cache.get('a', lambda: 'reloaded'), 'a')
+
+    def test_tokens_without_claims_still_work(self):
+        token = RefreshToken.for_user(self.doctor).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/doctor/patients/').status_code, status.HTTP_200_OK)
+
+    def test_user_detail_returns_full_row(self):
+        self.login('patient1')
+        response = self.client.get('/api/user/')
+        self.assertEqual(response.data['email'], 'patient@example.com')
+        response = self.client.patch('/api/user/', {'phone_number': '555-0100'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.patient.refresh_from_db()
+        self.assertEqual(self.patient.phone_number, '555-0100')
+        self.assertEqual(self.patient.email, 'patient@example.com')
+
+    def test_linking_uses_current_assignment(self):
+        self.login('patient1')
+        response = self.client.post('/api/patients/link-doctor/', {'doctor_code': self.doctor.doctor_code})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Still the pre-link token: message creation must not trust its doctor claim.
+        response = self.client.post('/api/send-message/', {'subject': 'Hi', 'message': 'Results?'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(self.doctor.received_messages.exists())
+
+
+@override_settings(USER_IMPORT_CHUNK_SIZE=3, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTestCase(APITestCase):
+    CSV = (
+        'username,email,password,user_type,first_name,doctor_code,doctor_username\n'
+        'dr-house,house@example.com,secret123,doctor,Greg,,\n'
+        'dr-wilson,,,doctor,James,,\n'
+        'p1,p1@example.com,secret123,user,,,dr-house\n'
+        'p2,,,user,,{code},\n'
+        'p3,,,user,,,dr-wilson\n'
+        'p4,,,user,,,\n'
+        'existing,,,user,,,\n'
+        'p1,,,user,,,\n'
+        'p5,not-an-email,,user,,,\n'
+        'p6,,,user,,NOPE1234,\n'
+        'dr-bad,,,doctor,,,dr-house\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create_user(username='existing', password='pass123', user_type='doctor')
+        self.admin = User.objects.create_user(username='admin', password='pass123', is_staff=True)
+        self.client.force_authenticate(user=self.admin)
+
+    def upload(self, content, name='users.csv', query=''):
+        return self.client.post(f'/api/users/import/{query}', {'file': SimpleUploadedFile(name, content.encode())})
+
+    def test_import_creates_links_and_reports_errors(self):
+        response = self.upload(self.CSV.format(code=self.doctor.doctor_code.lower()))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 6)
+        self.assertEqual(response.data['doctors'], 2)
+        self.assertEqual(response.data['assigned'], 3)
+        self.assertEqual([error['line'] for error in response.data['errors']], [8, 9, 10, 11, 12])
+
+        house, wilson = User.objects.get(username='dr-house'), User.objects.get(username='dr-wilson')
+        self.assertEqual(len({house.doctor_code, wilson.doctor_code, self.doctor.doctor_code}), 3)
+        self.assertTrue(User.objects.get(username='p1').check_password('secret123'))
+        self.assertFalse(User.objects.get(username='p2').has_usable_password())
+        self.assertEqual(User.objects.get(username='p2').assigned_doctor, self.doctor)
+        self.assertEqual(User.objects.get(username='p3').assigned_doctor, wilson)
+        self.assertIsNone(User.objects.get(username='p4').assigned_doctor)
+        self.assertEqual(
+            set(DoctorAssignmentLog.objects.filter(source='import').values_list('patient__username', flat=True)),
+            {'p1', 'p2', 'p3'},
+        )
+
+    def test_import_invalidates_doctor_patient_list(self):
+        self.client.force_authenticate(user=self.doctor)
+        self.assertEqual(len(self.client.get('/api/doctor/patients/').data['results']), 0)
+        self.client.force_authenticate(user=self.admin)
+        self.upload(f'username,doctor_code\nnew-patient,{self.doctor.doctor_code}\n')
+        self.client.force_authenticate(user=self.doctor)
+        self.assertEqual(len(self.client.get('/api/doctor/patients/').data['results']), 1)
+
+    def test_concurrent_registration_is_reported(self):
+        hash_passwords = importing._hash_passwords
+
+        def register_meanwhile(passwords):
+            User.objects.create_user(username='p2', password='pass123')
+            return hash_passwords(passwords)
+
+        with mock.patch('accounts.importing._hash_passwords', side_effect=register_meanwhile):
+            response = self.upload('username,password,user_type\np1,secret123,user\np2,,user\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        self.assertTrue(User.objects.get(username='p1').check_password('secret123'))
+
+    def test_dry_run_and_ndjson(self):
+        rows = [{'username': 'dr-a', 'user_type': 'doctor'}, {'username': 'p-a', 'doctor_username': 'dr-a'}]
+        content = '\n'.join(json.dumps(row) for row in rows) + '\n[]\n'
+        response = self.upload(content, name='users.ndjson', query='?dry_run=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['assigned'], response.data['failed']), (2, 1, 1))
+        self.assertFalse(User.objects.filter(username__in=['dr-a', 'p-a']).exists())
+
+    def test_undecodable_and_malformed_rows(self):
+        content = ('username,user_type\nok-1,user\n' + 'x' * 200000 + ',user\nok-2,user\n').encode()
+        response = self.client.post('/api/users/import/', {'file': SimpleUploadedFile('users.csv', content)})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+
+        content = 'username,user_type\nok-3,user\n'.encode() + b'bad-\xff\xfe,user\n'
+        response = self.client.post('/api/users/import/', {'file': SimpleUploadedFile('users.csv', content)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertIn('UTF-8', str(response.data['errors'][0]['errors']))
+
+    def test_import_requires_staff_and_known_format(self):
+        self.assertEqual(self.upload('username\nx\n', name='users.txt').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.doctor)
+        self.assertEqual(self.upload('username\nx\n').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_command(self):
+        stdout = io.StringIO()
+        path = self.create_file('username,user_type\ncmd-doctor,doctor\ncmd-patient,user\n')
+        call_command('import_users', path, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Created 2 user(s)', stdout.getvalue())
+        self.assertIsNotNone(User.objects.get(username='cmd-doctor').doctor_code)
+
+    def create_file(self, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class LoginProtectionTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='patient1', password='pass123', user_type='user')
+
+    def login(self, username='patient1', password='pass123', **extra):
+        return self.client.post('/api/login/', {'username': username, 'password': password}, **extra)
+
+    @override_settings(THROTTLE_BUCKETS={'login-username': '2/min'})
+    def test_login_throttled_per_username(self):
+        self.assertEqual(self.login(password='wrong').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        response = self.login(username='PATIENT1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.login(username='someone-else').status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(THROTTLE_BUCKETS={'register-ip': '1/hour'})
+    def test_register_throttled_per_ip(self):
+        data = {'username': 'new1', 'email': 'new1@example.com', 'password': 'pass123', 'user_type': 'user'}
+        self.assertEqual(self.client.post('/api/register/', data).status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='new1').check_password('pass123'))
+        data['username'] = 'new2'
+        response = self.client.post('/api/register/', data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post('/api/register/', data, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(THROTTLE_BUCKETS={'register-ip': '1/hour'})
+    def test_forwarded_for_does_not_reset_ip_bucket(self):
+        data = {'username': 'new1', 'email': 'new1@example.com', 'password': 'pass123', 'user_type': 'user'}
+        self.assertEqual(self.client.post('/api/register/', data).status_code, status.HTTP_201_CREATED)
+        data['username'] = 'new2'
+        response = self.client.post('/api/register/', data, HTTP_X_FORWARDED_FOR='203.0.113.9')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(THROTTLE_BUCKETS={'login-username': '2/min'})
+    def test_login_with_non_object_body(self):
+        response = self.client.post('/api/login/', [{'username': 'patient1'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_upgrades_outdated_hashes(self):
+        self.user.password = make_password('pass123', hasher='pbkdf2_sha1')
+        self.user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('pass123'))
+
+    def test_hashing_pool_rejects_when_full(self):
+        pool = HashingPool(1, 0, timeout=0)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        worker = threading.Thread(target=pool.run, args=(block,))
+        worker.start()
+        started.wait()
+        with self.assertRaises(HashingBusy):
+            pool.run(make_password, 'pass123')
+        release.set()
+        worker.join()
+        self.assertTrue(pool.run(make_password, 'pass123'))
@@ -8,5 +8,6 @@ urlpatterns = [
     path('user/<int:pk>/', views.UserDetailView.as_view(), name='user-detail-pk'),
     path('patients/link-doctor/', views.LinkDoctorView.as_view(), name='link-doctor'),
     path('doctor/patients/', views.DoctorPatientsView.as_view(), name='doctor-patients'),
+    path('users/import/', views.ImportUsersView.as_view(), name='import-users'),
     path('doctor/patients/<int:patient_id>/remove/', views.remove_patient, name='remove-patient'),
 ]
@@ -1,9 +1,15 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.decorators import permission_classes, api_view
 from rest_framework.views import APIView
+from leukemia_detection.caching import PerUserCacheMixin
+from leukemia_detection.mixins import EagerLoadingMixin
+from leukemia_detection.pagination import DateJoinedCursorPagination
+from leukemia_detection.throttling import IPTokenBucketThrottle, UsernameTokenBucketThrottle
+from .authentication import ClaimsRefreshToken, get_full_user
+from .importing import UserImport, detect_format, read_rows
 from .models import CustomUser, DoctorAssignmentLog
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, DoctorCodeLinkSerializer, DoctorBasicSerializer
 
@@ -19,16 +25,20 @@ class RegisterView(generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = RegisterSerializer
+    throttle_classes = (IPTokenBucketThrottle, UsernameTokenBucketThrottle)
+    throttle_scope = 'register'
 
 class LoginView(generics.GenericAPIView):
     permission_classes = (AllowAny,)
     serializer_class = LoginSerializer
+    throttle_classes = (IPTokenBucketThrottle, UsernameTokenBucketThrottle)
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -40,7 +50,7 @@ class UserDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
-        return self.request.user
+        return get_full_user(self.request.user, fresh=self.request.method not in ('GET', 'HEAD', 'OPTIONS'))
 
 class LinkDoctorView(APIView):
     permission_classes = (IsAuthenticated,)
@@ -59,7 +69,7 @@ class LinkDoctorView(APIView):
         # if not doctor.verified:
         #     return Response({'detail': 'Invalid doctor code or not available.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        patient = request.user
+        patient = get_full_user(request.user, fresh=True)
         if patient.user_type != 'user':
             return Response({'detail': 'Only patients can link to doctors.'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -81,14 +91,19 @@ class LinkDoctorView(APIView):
             source='doctor_code'
         )
 
+        # The old tokens still carry the previous doctor claim.
+        refresh = ClaimsRefreshToken.for_user(patient)
         return Response({
             'message': f'Doctor successfully linked. You will now see reports and messages from Dr. {doctor.first_name} {doctor.last_name}.',
-            'doctor': DoctorBasicSerializer(doctor).data
+            'doctor': DoctorBasicSerializer(doctor).data,
+            'refresh': str(refresh),
+            'access': str(refresh.access_token)
         }, status=status.HTTP_200_OK)
 
-class DoctorPatientsView(generics.ListAPIView):
+class DoctorPatientsView(PerUserCacheMixin, EagerLoadingMixin, generics.ListAPIView):
     permission_classes = (IsDoctor,)
     serializer_class = UserSerializer
+    pagination_class = DateJoinedCursorPagination
 
     def get_queryset(self):
         return CustomUser.objects.filter(assigned_doctor=self.request.user)
@@ -100,6 +115,8 @@ def remove_patient(request, patient_id):
         patient = CustomUser.objects.get(id=patient_id, assigned_doctor=request.user)
         patient.assigned_doctor = None
         patient.save()
+        # The patient's tokens still carry this doctor claim.
+        patient.revoke_tokens()
         DoctorAssignmentLog.objects.create(
             patient=patient,
             doctor=request.user,
@@ -109,3 +126,20 @@ def remove_patient(request, patient_id):
         return Response({'message': 'Patient removed successfully.'}, status=status.HTTP_200_OK)
     except CustomUser.DoesNotExist:
         return Response({'detail': 'Patient not found or not assigned to you.'}, status=status.HTTP_404_NOT_FOUND)
+
+class ImportUsersView(APIView):
+    # Staff upload a CSV or NDJSON file of doctors and patients; valid rows
+    # are created, invalid ones reported by line. ?dry_run=1 only validates.
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'No file uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+        format = request.data.get('format') or detect_format(upload.name, upload.content_type)
+        if format not in ('csv', 'ndjson'):
+            return Response({'detail': 'Upload a .csv or .ndjson file.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        summary = UserImport(dry_run=dry_run).run(read_rows(upload.file, format))
+        return Response(summary, status=status.HTTP_200_OK if dry_run or not summary['created'] else status.HTTP_201_CREATED)
@@ -0,0 +1,74 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .database import pin_to_primary
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'response-cache:version:{user_id}'
+
+
+def user_version(user_id):
+    # Seeded from the clock so a cleared or restarted cache never reissues
+    # an ETag a client may still hold.
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def invalidate_users(*user_ids):
+    pin_to_primary(*user_ids)
+    cache = _cache()
+    for user_id in {user_id for user_id in user_ids if user_id}:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+class PerUserCacheMixin:
+    # Caches a list response per user and URL. Writes that touch the user's
+    # data bump their version (see reports.receivers.caching), which changes both the
+    # cache key and the ETag, so an unchanged poll answers 304 before the
+    # queryset or serializer run.
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(PerUserCacheMixin, self).list(request, *args, **kwargs))
+
+    def cached_response(self, request, respond):
+        # respond() builds the response on a cache miss; views without a
+        # ListAPIView list() call this directly.
+        version = user_version(request.user.pk)
+        material = ':'.join(map(str, (
+            request.user.pk, version, request.accepted_renderer.format, request.build_absolute_uri(),
+        )))
+        digest = hashlib.sha256(material.encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache_key = f'response-cache:body:{digest}'
+        data = _cache().get(cache_key)
+        if data is None:
+            response = respond()
+            _cache().set(cache_key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        return response
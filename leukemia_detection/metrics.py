@@ -0,0 +1,220 @@
+import bisect
+import contextvars
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    # Cumulative-bucket histogram in the Prometheus text format, one series
+    # per label tuple. Observing is a bisect and three adds under a lock.
+
+    def __init__(self, name, help_text, buckets, labels=('route', 'method')):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self.series.items())]
+        for label_values, counts, total, count in items:
+            labels = ','.join(f'{label}="{value}"' for label, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=('route', 'method', 'status')):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self.lock:
+            items = sorted(self.values.items())
+        for label_values, value in items:
+            labels = ','.join(f'{label}="{value}"' for label, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+REQUESTS = Counter('http_requests_total', 'Requests by route, method and status.')
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time until the view returned a response.',
+                             DURATION_BUCKETS)
+DB_QUERIES = Histogram('http_request_db_queries', 'SQL queries per request.', QUERY_BUCKETS)
+DB_DURATION = Histogram('http_request_db_duration_seconds', 'Time spent in SQL per request.', DURATION_BUCKETS)
+PREDICTION_DURATION = Histogram('http_request_prediction_duration_seconds',
+                                'Time spent waiting on the prediction service per request.', DURATION_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+METRICS = (REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, PREDICTION_DURATION, RESPONSE_SIZE)
+
+
+class RequestSample:
+    __slots__ = ('queries', 'db_seconds', 'prediction_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.prediction_seconds = 0.0
+
+
+# Set for the duration of a request. Context variables follow the request
+# into sync_to_async threads, so queries made there are counted too.
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    sample = _current.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.db_seconds += time.perf_counter() - started
+
+
+def _install_query_timer(connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer)
+
+
+@contextmanager
+def prediction_timer():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample = _current.get()
+        if sample is not None:
+            sample.prediction_seconds += time.perf_counter() - started
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def _response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get('Content-Length')
+    return int(length) if length else None
+
+
+class RequestMetricsMiddleware:
+    # Records wall time, SQL count and time, prediction time and response
+    # size per request, feeds the histograms served at /metrics and adds a
+    # Server-Timing header. Works for sync and async views without forcing
+    # either onto the other's thread model.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sample = RequestSample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, sample, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        sample = RequestSample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, sample, time.perf_counter() - started)
+
+    def finish(self, request, response, sample, elapsed):
+        route, method = _route(request), request.method
+        REQUESTS.inc(route, method, str(response.status_code))
+        REQUEST_DURATION.observe(elapsed, route, method)
+        DB_QUERIES.observe(sample.queries, route, method)
+        DB_DURATION.observe(sample.db_seconds, route, method)
+        if sample.prediction_seconds:
+            PREDICTION_DURATION.observe(sample.prediction_seconds, route, method)
+        size = _response_size(response)
+        if size is not None:
+            RESPONSE_SIZE.observe(size, route, method)
+
+        timings = [
+            f'app;dur={elapsed * 1000:.1f}',
+            f'db;dur={sample.db_seconds * 1000:.1f};desc="{sample.queries} queries"',
+        ]
+        if sample.prediction_seconds:
+            timings.append(f'predict;dur={sample.prediction_seconds * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,37 @@
+from django.db.models.fields.files import FieldFile
+
+
+class EagerLoadingMixin:
+    # Lets the serializer declare the select_related/only() it needs, so
+    # list views load related users in the same query instead of one per row.
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.get_serializer_class().setup_eager_loading(queryset)
+
+
+class LoadedValuesMixin:
+    # Keeps the values of `tracked_fields` (attnames) as read by from_db and
+    # as last saved, so post_save receivers can tell what a save changed.
+    # Only rows read from the database pay for it, and only for these
+    # fields; deferred ones are left out.
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        row = dict(zip(field_names, values))
+        instance._loaded = {field: row[field] for field in cls.tracked_fields if field in row}
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        deferred = self.get_deferred_fields()
+        self._loaded = {
+            field: _stored(getattr(self, field)) for field in self.tracked_fields if field not in deferred
+        }
+
+
+def _stored(value):
+    # A file field holds its name in the row.
+    return value.name if isinstance(value, FieldFile) else value
@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    # Cursor pagination seeks on the ordering columns instead of using
+    # OFFSET, so deep pages cost the same as the first one. The trailing
+    # `id` keeps the order stable between rows created in the same instant.
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class UploadedAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-uploaded_at', '-id')
+
+
+class DateJoinedCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-date_joined', '-id')
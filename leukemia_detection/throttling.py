@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60, 'h': 3600, 'hour': 3600,
+           'd': 86400, 'day': 86400}
+
+# Buckets are read and written back under this lock, which makes each take
+# atomic with the default per-process cache. With a shared backend two
+# processes can occasionally both spend the last token.
+_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    # '10/min' -> a bucket of 10 tokens refilled at 10 per minute.
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period.strip().lower()]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Lets a client burst up to the bucket size, then refills continuously,
+    # so a steady trickle of requests never hits a window boundary. The rate
+    # is looked up as THROTTLE_BUCKETS[f'{view.throttle_scope}-{kind}'];
+    # subclasses say what identifies the client. Only POSTs are counted.
+    kind = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = settings.THROTTLE_BUCKETS.get(f'{getattr(view, "throttle_scope", None)}-{self.kind}')
+        if request.method != 'POST' or rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        capacity, refill = parse_rate(rate)
+        cache = caches[settings.THROTTLE_CACHE_ALIAS]
+        digest = hashlib.sha256(str(key).encode()).hexdigest()[:32]
+        cache_key = f'throttle:{view.throttle_scope}-{self.kind}:{digest}'
+        now = time.time()
+        with _lock:
+            tokens, stamp = cache.get(cache_key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cache.set(cache_key, (tokens, now), int(capacity / refill) + 1)
+        self.retry_after = None if allowed else (1 - tokens) / refill
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class UsernameTokenBucketThrottle(TokenBucketThrottle):
+    # Keyed on the username being signed in to (or registered), so one
+    # account cannot be guessed at from many addresses.
+    kind = 'username'
+
+    def get_key(self, request, view):
+        if not isinstance(request.data, Mapping):
+            return None
+        username = request.data.get('username')
+        return username.strip().lower() if isinstance(username, str) and username.strip() else None
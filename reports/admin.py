@@ -1,8 +1,22 @@
 from django.contrib import admin
-from .models import Report
+from .models import Report, PredictionJob, PredictionCacheEntry
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'doctor', 'result', 'verified', 'created_at')
     list_filter = ('verified', 'created_at')
     search_fields = ('user__username', 'doctor__username', 'result')
+
+
+@admin.register(PredictionJob)
+class PredictionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
+@admin.register(PredictionCacheEntry)
+class PredictionCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'model_version', 'result', 'hits', 'last_used_at')
+    list_filter = ('model_version',)
+    search_fields = ('sha256',)
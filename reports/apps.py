@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        from django.core import checks
+        from leukemia_detection.database import check_pin_cache
+        from . import receivers  # noqa: F401
+        checks.register(check_pin_cache, checks.Tags.database)
@@ -0,0 +1,160 @@
+import json
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+
+from accounts.authentication import authenticate_request
+from accounts.models import CustomUser
+from . import events, prediction_cache
+from .prediction import PredictionError, get_async_client
+from .serializers import ReportSerializer
+from .uploads import IMAGE_TYPES, StreamingUploadHandler
+from .views import PredictionServiceUnavailable, save_cached_report, save_predicted_report
+
+# Plain Django async views for the endpoints that mostly wait on I/O. Under
+# ASGI (leukemia_detection.asgi) a request blocked on the predictor or a
+# gateway holds a coroutine rather than a worker thread. DRF views are sync,
+# so these authenticate and report errors the same way by hand.
+
+
+class NotificationUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Notification service is unavailable, please try again later.'
+    default_code = 'notification_unavailable'
+
+
+def token_authenticated(view):
+    # Like DRF's APIView: bearer tokens are not ambient credentials, so the
+    # CSRF check does not apply. Set directly because csrf_exempt wraps
+    # async views in a sync function on this Django version.
+    view.csrf_exempt = True
+    return view
+
+
+def _error(exc):
+    detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    return JsonResponse(detail, status=exc.status_code)
+
+
+def _method_not_allowed(request):
+    return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+def _parse_upload(request):
+    # Multipart parsing, validation and hashing touch no database, so they
+    # run with thread_sensitive=False instead of queueing on the one thread
+    # that every ORM call shares.
+    request.upload_handlers = [
+        StreamingUploadHandler(request, max_size=settings.REPORT_IMAGE_MAX_UPLOAD_SIZE, allowed_types=IMAGE_TYPES)
+    ]
+    serializer = ReportSerializer(data={**request.POST.dict(), **request.FILES.dict()}, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    return serializer, prediction_cache.hash_file(serializer.validated_data['image'])
+
+
+def _save(save, serializer, *args):
+    # serializer.data is built on the same thread, since it may query.
+    save(serializer, *args)
+    return serializer.data
+
+
+@token_authenticated
+async def upload_report(request):
+    # Async twin of ReportUploadView's synchronous path.
+    if request.method != 'POST':
+        return _method_not_allowed(request)
+    try:
+        user = await sync_to_async(authenticate_request)(request)
+        serializer, digest = await sync_to_async(_parse_upload, thread_sensitive=False)(request)
+        cached = await sync_to_async(prediction_cache.lookup)(digest)
+        if cached:
+            data = await sync_to_async(_save)(save_cached_report, serializer, user, digest, cached)
+        else:
+            try:
+                result = await get_async_client().predict(serializer.validated_data['image'])
+            except PredictionError:
+                raise PredictionServiceUnavailable()
+            data = await sync_to_async(_save)(save_predicted_report, serializer, user, digest, result['class'])
+    except APIException as exc:
+        return _error(exc)
+    return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+
+async def _notify(payload):
+    try:
+        async with httpx.AsyncClient(timeout=settings.NOTIFICATION_TIMEOUT) as client:
+            response = await client.post(settings.NOTIFICATION_WEBHOOK_URL, json=payload)
+        response.raise_for_status()
+    except httpx.HTTPError:
+        raise NotificationUnavailable()
+
+
+@token_authenticated
+async def contact_doctor(request):
+    # Async twin of ContactDoctorView that also forwards the message to the
+    # notification gateway when one is configured.
+    if request.method != 'POST':
+        return _method_not_allowed(request)
+    try:
+        user = await sync_to_async(authenticate_request)(request)
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                raise ParseError()
+        else:
+            data = request.POST
+        if settings.NOTIFICATION_WEBHOOK_URL:
+            doctor_id = await CustomUser.objects.filter(pk=user.pk).values_list('assigned_doctor_id', flat=True).afirst()
+            await _notify({
+                'patient_id': user.pk,
+                'username': user.username,
+                'doctor_id': doctor_id,
+                'message': data.get('message'),
+            })
+    except APIException as exc:
+        return _error(exc)
+    return JsonResponse({"message": "Message sent successfully"}, status=status.HTTP_200_OK)
+
+
+@token_authenticated
+async def event_stream(request):
+    # Sends text/event-stream to EventSource clients and answers everyone
+    # else as a long poll.
+    if request.method != 'GET':
+        return _method_not_allowed(request)
+    try:
+        user = await sync_to_async(authenticate_request)(request, allow_query_token=True)
+    except APIException as exc:
+        return JsonResponse({'detail': str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+    since = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    if since is not None and not since.isdigit():
+        return JsonResponse({'detail': 'since must be an event id.'}, status=status.HTTP_400_BAD_REQUEST)
+    resumed = since is not None
+    if not resumed:
+        # No cursor: start from now, so only new deltas are delivered.
+        since = await events.alatest_cursor(user.pk)
+
+    if 'text/event-stream' in request.headers.get('Accept', ''):
+        response = StreamingHttpResponse(events.sse_stream(user.pk, int(since)), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    # Without a cursor the first poll only hands out the starting cursor.
+    wait = 0
+    if resumed:
+        try:
+            wait = min(float(request.GET.get('wait', settings.EVENT_LONG_POLL_TIMEOUT)), settings.EVENT_LONG_POLL_TIMEOUT)
+        except ValueError:
+            wait = settings.EVENT_LONG_POLL_TIMEOUT
+    found = await events.long_poll(user.pk, int(since), wait)
+    return JsonResponse({
+        'events': [events.serialize(event) for event in found],
+        'cursor': found[-1].id if found else int(since),
+    })
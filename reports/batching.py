@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+
+from .prediction import BatchNotSupported, PredictionError, get_client
+
+
+class PredictionBatcher:
+    # Collects images submitted by concurrent request or worker threads and
+    # sends them to the predictor as one batch once the window closes or the
+    # batch is full. Each caller blocks on its own future, so results land on
+    # the matching report without any bookkeeping by the caller.
+
+    def __init__(self, client, window, max_batch_size, workers=4, timeout=None, fallback_workers=10,
+                 reprobe_interval=300):
+        self.client = client
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        # After the predictor rejects a batch, single calls are used until
+        # this time, then the batch endpoint is tried again.
+        self.reprobe_interval = reprobe_interval
+        self.batch_retry_at = 0
+        self.pending = []
+        self.condition = threading.Condition()
+        self.thread = None
+        # Batches are sent from `workers` threads, so one slow batch does
+        # not hold up the collection of the next.
+        self.dispatcher = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prediction-batch')
+        # Single calls share the client's connection pool, so they run on
+        # no more threads than it has connections.
+        self.fallback = ThreadPoolExecutor(max_workers=fallback_workers, thread_name_prefix='prediction-single')
+
+    @property
+    def batch_supported(self):
+        return time.monotonic() >= self.batch_retry_at
+
+    def submit(self, image):
+        future = Future()
+        with self.condition:
+            self.pending.append((time.monotonic(), image, future))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='prediction-batcher', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return future
+
+    def predict(self, image):
+        future = self.submit(image)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Still queued: dispatch skips it. Already sent: its result is
+            # dropped.
+            future.cancel()
+            raise PredictionError(f"No prediction within {self.timeout} seconds")
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                deadline = self.pending[0][0] + self.window
+                while len(self.pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.pending[:self.max_batch_size]
+                del self.pending[:self.max_batch_size]
+            self.dispatcher.submit(self.dispatch, [(image, future) for _, image, future in batch])
+
+    def dispatch(self, batch):
+        # Callers that gave up before now are left out of the request.
+        batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        if len(batch) == 1 or not self.batch_supported:
+            self.dispatch_singly(batch)
+            return
+        try:
+            results = self.client.predict_batch([image for image, _ in batch])
+        except BatchNotSupported:
+            self.batch_retry_at = time.monotonic() + self.reprobe_interval
+            self.dispatch_singly(batch)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc if isinstance(exc, PredictionError) else PredictionError(str(exc)))
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def dispatch_singly(self, batch):
+        for image, future in batch:
+            self.fallback.submit(self.predict_one, image, future)
+
+    def predict_one(self, image, future):
+        try:
+            future.set_result(self.client.predict(image))
+        except Exception as exc:
+            future.set_exception(exc)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = PredictionBatcher(
+                    get_client(),
+                    window=settings.PREDICTION_BATCH_WINDOW,
+                    max_batch_size=settings.PREDICTION_BATCH_MAX_SIZE,
+                    workers=settings.PREDICTION_BATCH_WORKERS,
+                    timeout=settings.PREDICTION_BATCH_TIMEOUT,
+                    fallback_workers=settings.PREDICTION_POOL_SIZE,
+                    reprobe_interval=settings.PREDICTION_BATCH_REPROBE_INTERVAL,
+                )
+    return _batcher
@@ -0,0 +1,247 @@
+import importlib
+import io
+import itertools
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from accounts.authentication import ClaimsRefreshToken
+from accounts.models import CustomUser
+from .models import Report, PatientReport, PatientMessage, PredictionJob, UserEvent
+from .seeding import SEED_IMAGE, SEED_PDF, UNUSABLE_PASSWORD
+
+URLCONFS = ('accounts.urls', 'reports.urls')
+LOGIN_PASSWORD = 'bench-pass-123'
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def route_names():
+    names = []
+    for urlconf in URLCONFS:
+        names += [pattern.name for pattern in importlib.import_module(urlconf).urlpatterns if pattern.name]
+    return names
+
+
+def image_file(n=0):
+    # Distinct pixels per call, so uploads miss the prediction cache.
+    buffer = io.BytesIO()
+    Image.new('RGB', (256, 256), (n % 256, n // 256 % 256, 30)).save(buffer, format='JPEG')
+    return SimpleUploadedFile('bench.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+def users_file(context, rows=100):
+    # Fresh usernames per call; passwords are left blank so the import
+    # measures inserts rather than PBKDF2.
+    lines = ['username,user_type,doctor_code']
+    lines += [f'{context.unique("bench-import")},user,{context.doctor.doctor_code}' for _ in range(rows)]
+    return SimpleUploadedFile('users.csv', '\n'.join(lines).encode(), content_type='text/csv')
+
+
+def pdf_file():
+    return SimpleUploadedFile('bench.pdf', b'%PDF-1.4\n%benchmark\n%%EOF\n', content_type='application/pdf')
+
+
+class BenchmarkContext:
+    # The objects the scenarios act on: the busiest seeded doctor and one of
+    # their patients, plus a row of each kind the detail routes need.
+
+    def __init__(self, doctor, patient):
+        self.doctor = doctor
+        self.patient = patient
+        self.report = Report.objects.filter(user=patient).order_by('-id').first() or Report.objects.create(
+            user=patient, doctor=doctor, image=SEED_IMAGE, result='ALL', verified=True
+        )
+        self.patient_report = PatientReport.objects.filter(patient=patient).order_by('-id').first() or \
+            PatientReport.objects.create(patient=patient, doctor=doctor, report_file=SEED_PDF)
+        self.message = PatientMessage.objects.filter(doctor=doctor).order_by('-id').first() or \
+            PatientMessage.objects.create(patient=patient, doctor=doctor, subject='Benchmark', message='Benchmark')
+        self.job = PredictionJob.objects.get_or_create(report=self.report, defaults={'status': 'done'})[0]
+        event = UserEvent.objects.filter(user=patient).order_by('-id').first()
+        self.event_cursor = event.id if event else 0
+        self.login_user = CustomUser.objects.filter(username='bench-login').first()
+        if self.login_user is None:
+            self.login_user = CustomUser.objects.create_user(
+                username='bench-login', password=LOGIN_PASSWORD, user_type='user'
+            )
+        self.admin = CustomUser.objects.filter(username='bench-admin').first() or CustomUser.objects.create(
+            username='bench-admin', password=UNUSABLE_PASSWORD, user_type='doctor', is_staff=True
+        )
+        self.sequence = itertools.count()
+        self.run = int(time.time())
+        self.tokens = {}
+
+    def token(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = str(ClaimsRefreshToken.for_user(user).access_token)
+        return self.tokens[user.pk]
+
+    def unique(self, prefix):
+        return f'{prefix}-{self.run}-{next(self.sequence)}'
+
+    def image(self):
+        return image_file(next(self.sequence))
+
+    def new_patient(self, doctor=None):
+        return CustomUser.objects.create(
+            username=self.unique('bench-patient'), password=UNUSABLE_PASSWORD, user_type='user', assigned_doctor=doctor
+        )
+
+
+def call(method, name, user=None, args=(), data=None, format='multipart', query=''):
+    return {'method': method, 'path': reverse(name, args=args) + query, 'user': user, 'data': data, 'format': format}
+
+
+# One request per route, built fresh for every iteration. Work done here
+# (creating throwaway patients, files) is not timed.
+SCENARIOS = {
+    'register': lambda c: call('post', 'register', data={
+        'username': c.unique('bench-register'), 'email': 'bench@example.com', 'password': LOGIN_PASSWORD,
+        'user_type': 'user',
+    }),
+    'login': lambda c: call('post', 'login', data={'username': 'bench-login', 'password': LOGIN_PASSWORD}),
+    'user-detail': lambda c: call('get', 'user-detail', c.patient),
+    'user-detail-pk': lambda c: call('get', 'user-detail-pk', c.patient, [c.patient.pk]),
+    'link-doctor': lambda c: call('post', 'link-doctor', c.new_patient(), data={'doctor_code': c.doctor.doctor_code}),
+    'doctor-patients': lambda c: call('get', 'doctor-patients', c.doctor),
+    'import-users': lambda c: call('post', 'import-users', c.admin, data={'file': users_file(c)}),
+    'remove-patient': lambda c: call('delete', 'remove-patient', c.doctor, [c.new_patient(c.doctor).pk]),
+    'reports': lambda c: call('get', 'reports', c.doctor),
+    'report-image': lambda c: call('get', 'report-image', c.patient, [c.report.pk]),
+    'report-gradcam': lambda c: call('get', 'report-gradcam', c.patient, [c.report.pk]),
+    'patient-report-file': lambda c: call('get', 'patient-report-file', c.doctor, [c.patient_report.pk]),
+    'report-thumbnail': lambda c: call('get', 'report-thumbnail', c.patient, [c.report.pk, 'image', 'small']),
+    'upload': lambda c: call('post', 'upload', c.patient, data={'image': c.image(), 'result': 'n/a'}),
+    'prediction-job': lambda c: call('get', 'prediction-job', c.patient, [c.job.pk]),
+    'prediction-service-status': lambda c: call('get', 'prediction-service-status', c.admin),
+    'verify-report': lambda c: call('patch', 'verify-report', c.doctor, [c.report.pk], data={}, format='json'),
+    'send-report-to-patient': lambda c: call('patch', 'send-report-to-patient', c.doctor, [c.report.pk], data={},
+                                             format='json'),
+    # Bulk verification rewrites the comments of all the benchmark patient's
+    # reports on every iteration; bulk sending finds them already sent.
+    'bulk-verify-reports': lambda c: call('post', 'bulk-verify-reports', c.doctor, data={
+        'filter': {'patient': c.patient.pk}, 'comments': c.unique('bench'),
+    }, format='json'),
+    'bulk-send-reports': lambda c: call('post', 'bulk-send-reports', c.doctor, data={
+        'ids': list(Report.objects.filter(user=c.patient).values_list('id', flat=True)[:100]),
+    }, format='json'),
+    'contact-doctor': lambda c: call('post', 'contact-doctor', c.patient, data={'message': 'Benchmark'}),
+    'upload-patient-report': lambda c: call('post', 'upload-patient-report', c.patient, data={
+        'report_file': pdf_file(), 'doctor_code': c.doctor.doctor_code,
+    }),
+    'doctor-reports': lambda c: call('get', 'doctor-reports', c.doctor),
+    'patient-reports': lambda c: call('get', 'patient-reports', c.patient),
+    'verify-patient-report': lambda c: call('patch', 'verify-patient-report', c.doctor, [c.patient_report.pk],
+                                            data={'comments': 'ok'}, format='json'),
+    'bulk-verify-patient-reports': lambda c: call('post', 'bulk-verify-patient-reports', c.doctor, data={
+        'filter': {'patient': c.patient.pk}, 'comments': c.unique('bench'),
+    }, format='json'),
+    'patient-messages': lambda c: call('get', 'patient-messages', c.doctor),
+    'send-message': lambda c: call('post', 'send-message', c.patient, data={
+        'subject': 'Benchmark', 'message': 'Benchmark', 'priority': 'normal',
+    }),
+    'mark-message-read': lambda c: call('patch', 'mark-message-read', c.doctor, [c.message.pk], data={},
+                                        format='json'),
+    'bulk-mark-messages-read': lambda c: call('post', 'bulk-mark-messages-read', c.doctor, data={
+        'up_to': c.message.pk,
+    }, format='json'),
+    'unread-message-counts': lambda c: call('get', 'unread-message-counts', c.doctor),
+    'create-report-from-analysis': lambda c: call('post', 'create-report-from-analysis', c.doctor, data={
+        'patients': [c.patient.pk], 'image': c.image(), 'result': 'ALL', 'confidence': '0.9',
+    }),
+    'patient-microscopic-reports': lambda c: call('get', 'patient-microscopic-reports', c.patient),
+    'events': lambda c: call('get', 'events', c.patient, query=f'?since={c.event_cursor}&wait=0'),
+    'async-upload': lambda c: call('post', 'async-upload', c.patient, data={'image': c.image(), 'result': 'n/a'}),
+    'async-contact-doctor': lambda c: call('post', 'async-contact-doctor', c.patient, data={'message': 'Benchmark'}),
+    'export': lambda c: call('get', 'export', c.doctor, ['reports', 'csv']),
+    'search': lambda c: call('get', 'search', c.doctor, query='?q=seed'),
+    'doctor-report-stats': lambda c: call('get', 'doctor-report-stats', c.doctor),
+}
+
+
+def _send(client, context, request):
+    headers = {}
+    if request['user'] is not None:
+        headers['HTTP_AUTHORIZATION'] = f"Bearer {context.token(request['user'])}"
+    send = getattr(client, request['method'])
+    if request['data'] is None:
+        return send(request['path'], **headers)
+    if request['format'] == 'json':
+        return send(request['path'], request['data'], content_type='application/json', **headers)
+    return send(request['path'], request['data'], **headers)
+
+
+def _drain(response):
+    # Streaming responses only do their work while being consumed.
+    if response.streaming:
+        for _ in response:
+            pass
+    response.close()
+
+
+def benchmark_route(context, name, requests=50, concurrency=1, warmup=2):
+    scenario = SCENARIOS[name]
+
+    def one(_):
+        client = Client(raise_request_exception=False)
+        request = scenario(context)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = _send(client, context, request)
+            _drain(response)
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000, len(queries), response.status_code
+
+    def threaded(index):
+        try:
+            return one(index)
+        finally:
+            close_old_connections()
+
+    for _ in range(warmup):
+        one(None)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(threaded, range(requests)))
+    else:
+        samples = [one(None) for _ in range(requests)]
+    elapsed = time.perf_counter() - started
+
+    timings = sorted(sample[0] for sample in samples)
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(timings[-1], 3),
+        'throughput_rps': round(requests / elapsed, 2),
+        'queries_per_request': round(sum(sample[1] for sample in samples) / requests, 2),
+        'statuses': {str(code): count for code, count in sorted(Counter(sample[2] for sample in samples).items())},
+    }
+
+
+def compare(baseline, current, metrics=('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')):
+    # Relative change per route and metric; positive means slower or more queries.
+    rows = {}
+    for name, result in current.get('routes', {}).items():
+        before = baseline.get('routes', {}).get(name)
+        if not before:
+            continue
+        rows[name] = {
+            metric: round((result[metric] - before[metric]) / before[metric] * 100, 1) if before[metric] else None
+            for metric in metrics
+        }
+    return rows
@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.utils import timezone
+
+from . import events
+from .models import Report, PatientReport, PatientMessage
+from .signals import bulk_changed
+
+
+class BulkUpdate:
+    # One change applied to many rows with a single set-based UPDATE inside
+    # a transaction, instead of a load, validate and save per row. Only rows
+    # the change would modify (stale()) are written, and only those produce
+    # events and the bulk_changed signal. Subclasses say what changes.
+    model = None
+    fields = ('id',)
+
+    def values(self):
+        raise NotImplementedError
+
+    def stale(self):
+        raise NotImplementedError
+
+    def events(self, rows):
+        # (user_id, kind, payload) for the rows about to be updated.
+        return []
+
+    def run(self, queryset, ids=None, filters=None, limit=1000):
+        # queryset holds the rows the user may change. With ids, each id is
+        # reported as updated, unchanged, forbidden or not_found; with
+        # filters, up to `limit` (None: all) matching stale rows are updated
+        # and `more` says whether another request would find further ones.
+        with transaction.atomic():
+            if ids is not None:
+                # One query finds both the visible ids and the stale ones.
+                rows = list(queryset.filter(id__in=ids).select_for_update().annotate(
+                    stale=ExpressionWrapper(self.stale(), output_field=BooleanField())
+                ).values(*self.fields, 'stale'))
+                visible = {row['id'] for row in rows}
+                rows = [row for row in rows if row['stale']]
+                more = False
+            else:
+                rows = queryset.filter(**filters).filter(self.stale()).select_for_update().order_by('id') \
+                    .values(*self.fields)
+                rows = list(rows if limit is None else rows[:limit + 1])
+                more = limit is not None and len(rows) > limit
+                rows = rows[:limit]
+            updated = [row['id'] for row in rows]
+            values = self.values()
+            if updated:
+                self.model.objects.filter(id__in=updated).update(**values)
+                events.record_many(self.events(rows))
+        if updated:
+            bulk_changed.send(sender=self.model, ids=updated, fields=tuple(values))
+
+        if ids is None:
+            return {'updated': len(updated), 'more': more, 'results': [{'id': pk, 'status': 'updated'} for pk in updated]}
+        existing = visible | set(self.model.objects.filter(id__in=set(ids) - visible).values_list('id', flat=True))
+        updated = set(updated)
+        results = [
+            {'id': pk, 'status': 'updated' if pk in updated else 'unchanged' if pk in visible
+             else 'forbidden' if pk in existing else 'not_found'}
+            for pk in dict.fromkeys(ids)
+        ]
+        return {'updated': len(updated), 'more': more, 'results': results}
+
+
+class ReportVerification(BulkUpdate):
+    # Marks microscopic reports verified by `doctor`, optionally setting
+    # their comments and sending them to the patients in the same UPDATE.
+    model = Report
+    fields = ('id', 'user_id', 'verified', 'sent_to_patient')
+
+    def __init__(self, doctor, comments=None, send=False):
+        self.doctor = doctor
+        self.comments = comments
+        self.send = send
+
+    def values(self):
+        values = {'verified': True, 'doctor': self.doctor}
+        if self.comments is not None:
+            values['comments'] = self.comments
+        if self.send:
+            values.update(sent_to_patient=True, sent_at=timezone.now())
+        return values
+
+    def stale(self):
+        stale = Q(verified=False)
+        if self.comments is not None:
+            stale |= ~Q(comments=self.comments)
+        if self.send:
+            stale |= Q(sent_to_patient=False)
+        return stale
+
+    def events(self, rows):
+        for row in rows:
+            if not row['verified']:
+                yield row['user_id'], 'report_verified', {'id': row['id']}
+            if self.send and not row['sent_to_patient']:
+                yield row['user_id'], 'report_sent', {'id': row['id']}
+
+
+class ReportSending(BulkUpdate):
+    model = Report
+    fields = ('id', 'user_id')
+
+    def values(self):
+        return {'sent_to_patient': True, 'sent_at': timezone.now()}
+
+    def stale(self):
+        return Q(sent_to_patient=False)
+
+    def events(self, rows):
+        for row in rows:
+            yield row['user_id'], 'report_sent', {'id': row['id']}
+
+
+class PatientReportVerification(BulkUpdate):
+    model = PatientReport
+    fields = ('id', 'patient_id', 'verified')
+
+    def __init__(self, comments=None):
+        self.comments = comments
+
+    def values(self):
+        values = {'verified': True}
+        if self.comments is not None:
+            values['comments'] = self.comments
+        return values
+
+    def stale(self):
+        stale = Q(verified=False)
+        if self.comments is not None:
+            stale |= ~Q(comments=self.comments)
+        return stale
+
+    def events(self, rows):
+        for row in rows:
+            if not row['verified']:
+                yield row['patient_id'], 'patient_report_verified', {'id': row['id']}
+
+
+class MessagesRead(BulkUpdate):
+    # Marks a doctor's messages read. One messages_read event carries the
+    # ids (or the watermark) and the doctor's remaining unread count.
+    model = PatientMessage
+
+    def __init__(self, doctor, up_to=None):
+        self.doctor = doctor
+        self.up_to = up_to
+
+    def values(self):
+        return {'is_read': True}
+
+    def stale(self):
+        return Q(is_read=False)
+
+    def mark_up_to(self, queryset):
+        # The watermark form: one UPDATE of every unread message up to the
+        # id. Their ids are read under the row lock first, so receivers get
+        # only the messages this call changed, not the already-read ones.
+        with transaction.atomic():
+            updated = list(queryset.filter(id__lte=self.up_to).filter(self.stale()).select_for_update()
+                           .values_list('id', flat=True))
+            if updated:
+                self.model.objects.filter(id__in=updated).update(**self.values())
+                events.record_many(self.events([]))
+        if updated:
+            bulk_changed.send(sender=self.model, ids=updated, fields=tuple(self.values()))
+        return {'updated': len(updated), 'more': False}
+
+    def events(self, rows):
+        # Built after the UPDATE, inside the same transaction.
+        unread = events.unread_count(self.doctor.pk)
+        marked = {'up_to': self.up_to} if self.up_to is not None else {'ids': [row['id'] for row in rows]}
+        yield self.doctor.pk, 'messages_read', {**marked, 'unread': unread}
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import PatientMessage, UserEvent
+
+BATCH_SIZE = 100
+
+
+def unread_count(doctor_id):
+    return PatientMessage.objects.filter(doctor_id=doctor_id, is_read=False).count()
+
+
+def unread_counts(doctor_id):
+    # One GROUP BY over the message_unread_priority partial index.
+    by_priority = dict.fromkeys(dict(PatientMessage.PRIORITY_CHOICES), 0)
+    by_priority.update(
+        PatientMessage.objects.filter(doctor_id=doctor_id, is_read=False)
+        .values_list('priority').annotate(Count('id')).order_by()
+    )
+    return {'total': sum(by_priority.values()), 'by_priority': by_priority}
+
+
+def record(user_id, kind, **payload):
+    if user_id:
+        UserEvent.objects.create(user_id=user_id, kind=kind, payload=payload)
+
+
+def record_many(events):
+    # events: iterable of (user_id, kind, payload)
+    UserEvent.objects.bulk_create(
+        UserEvent(user_id=user_id, kind=kind, payload=payload)
+        for user_id, kind, payload in events if user_id
+    )
+
+
+def serialize(event):
+    return {'id': event.id, 'kind': event.kind, 'data': event.payload, 'created_at': event.created_at.isoformat()}
+
+
+def latest_cursor(user_id):
+    event = UserEvent.objects.filter(user_id=user_id).order_by('-id').only('id').first()
+    return event.id if event else 0
+
+
+def fetch(user_id, since):
+    return list(UserEvent.objects.filter(user_id=user_id, id__gt=since).order_by('id')[:BATCH_SIZE])
+
+
+def _off_thread(func):
+    # Django's async ORM runs every query on the single thread_sensitive
+    # thread, where each open stream's polls would queue behind uploads and
+    # each other. These reads need no transaction state, so they run on the
+    # default executor; its threads keep their own connections, retired by
+    # CONN_MAX_AGE like a request's.
+    def call(*args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+alatest_cursor = _off_thread(latest_cursor)
+afetch = _off_thread(fetch)
+
+
+async def long_poll(user_id, since, wait):
+    # One indexed range query per poll interval until something arrives.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        events = await afetch(user_id, since)
+        if events or loop.time() >= deadline:
+            return events
+        await asyncio.sleep(settings.EVENT_POLL_INTERVAL)
+
+
+async def sse_stream(user_id, since):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENT_STREAM_MAX_DURATION
+    last_write = loop.time()
+    yield f'retry: {settings.EVENT_RETRY_MS}\n\n'
+    while loop.time() < deadline:
+        events = await afetch(user_id, since)
+        for event in events:
+            since = event.id
+            yield f'id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(serialize(event))}\n\n'
+        if events:
+            last_write = loop.time()
+            if len(events) == BATCH_SIZE:
+                continue
+        elif loop.time() - last_write >= settings.EVENT_KEEPALIVE_INTERVAL:
+            last_write = loop.time()
+            yield ': keepalive\n\n'
+        await asyncio.sleep(settings.EVENT_POLL_INTERVAL)
+    # Clients reconnect with Last-Event-ID, which frees the connection slot.
+
+
+def prune(days=None):
+    days = settings.USER_EVENT_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = UserEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
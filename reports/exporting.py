@@ -0,0 +1,103 @@
+import csv
+import io
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Report, PatientReport, PatientMessage
+
+# kind -> (model, {column: ORM lookup}). Columns are written in this order.
+EXPORTS = {
+    'reports': (Report, {
+        'id': 'id', 'patient_id': 'user_id', 'patient': 'user__username', 'doctor_id': 'doctor_id',
+        'result': 'result', 'verified': 'verified', 'sent_to_patient': 'sent_to_patient', 'sent_at': 'sent_at',
+        'created_at': 'created_at', 'comments': 'comments', 'image': 'image',
+    }),
+    'patient-reports': (PatientReport, {
+        'id': 'id', 'patient_id': 'patient_id', 'patient': 'patient__username', 'doctor_id': 'doctor_id',
+        'uploaded_at': 'uploaded_at', 'verified': 'verified', 'comments': 'comments', 'report_file': 'report_file',
+    }),
+    'messages': (PatientMessage, {
+        'id': 'id', 'patient_id': 'patient_id', 'patient': 'patient__username', 'doctor_id': 'doctor_id',
+        'subject': 'subject', 'message': 'message', 'priority': 'priority', 'is_read': 'is_read',
+        'created_at': 'created_at',
+    }),
+}
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+# Rendered output is handed on in pieces of about this many bytes.
+BUFFER_SIZE = 64 * 1024
+
+
+def for_doctor(queryset, kind, doctor_id):
+    # Reports belong to the doctor their patient is assigned to.
+    owner = 'user__assigned_doctor_id' if kind == 'reports' else 'doctor_id'
+    return queryset.filter(**{owner: doctor_id})
+
+
+def rows(queryset, kind, chunk_size=None):
+    # Tuples in id order, fetched chunk_size at a time (a server-side cursor
+    # on PostgreSQL), so no more than one chunk is held in memory.
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return queryset.order_by('id').values_list(*EXPORTS[kind][1].values()).iterator(chunk_size=chunk_size)
+
+
+# CSV cells starting with these are formulas to spreadsheet applications.
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+def _cell(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Shown as text rather than evaluated when the file is opened.
+        return "'" + value
+    return value
+
+
+def render(kind, rows, format, buffer_size=BUFFER_SIZE):
+    # Yields the encoded file: a header row for CSV, one object per line for
+    # NDJSON.
+    columns = list(EXPORTS[kind][1])
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([_cell(value) for value in row])
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        write = lambda row: buffer.write(encoder.encode(dict(zip(columns, row))) + '\n')
+    for row in rows:
+        write(row)
+        if buffer.tell() >= buffer_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzipped(chunks, level=6):
+    # Compresses on the fly into a gzip container (wbits 31).
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(queryset, kind, format, compress=False, chunk_size=None):
+    chunks = render(kind, rows(queryset, kind, chunk_size), format)
+    return gzipped(chunks) if compress else chunks
+
+
+async def in_thread(chunks):
+    # Under ASGI Django reads a synchronous streaming iterator to the end
+    # before sending anything. This pulls one chunk at a time instead, on
+    # the thread that owns the database connection and cursor.
+    chunks = iter(chunks)
+    pull = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await pull(chunks, None)) is not None:
+        yield chunk
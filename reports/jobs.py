@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PredictionJob
+from .prediction import PredictionUnavailable, predict_image
+from . import prediction_cache
+from .thumbnails import generate_report_thumbnails
+
+
+def enqueue_prediction(report):
+    return PredictionJob.objects.create(report=report)
+
+
+def claim_next_job():
+    # Jobs are claimed with a compare-and-set UPDATE so several workers can
+    # share the table without a broker or row locks. A job left 'running' by
+    # a crashed worker becomes claimable again once it is stale, unless it
+    # has used up its attempts, in which case it fails.
+    now = timezone.now()
+    stale = Q(status='running', started_at__lt=now - timedelta(seconds=settings.PREDICTION_JOB_TIMEOUT))
+    PredictionJob.objects.filter(stale, attempts__gte=settings.PREDICTION_JOB_MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, error='Abandoned by its worker',
+    )
+    due = Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+    claimable = (Q(status='pending') & due) | (stale & Q(attempts__lt=settings.PREDICTION_JOB_MAX_ATTEMPTS))
+    candidates = PredictionJob.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        claimed = PredictionJob.objects.filter(claimable, id=job_id).update(
+            status='running',
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return PredictionJob.objects.select_related('report').get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    # Exponential backoff: PREDICTION_JOB_RETRY_BACKOFF after the first
+    # failure, doubling up to PREDICTION_JOB_RETRY_MAX_DELAY.
+    return min(settings.PREDICTION_JOB_RETRY_BACKOFF * 2 ** max(attempts - 1, 0), settings.PREDICTION_JOB_RETRY_MAX_DELAY)
+
+
+def run_job(job):
+    report = job.report
+    cached = prediction_cache.lookup(report.image_sha256)
+    try:
+        if cached:
+            result = {'class': cached.result}
+        else:
+            with report.image.open('rb') as image:
+                result = predict_image(image)
+    except PredictionUnavailable as exc:
+        # The circuit is open: nothing was sent, so the attempt is given
+        # back and the job waits for the circuit to try again.
+        job.status = 'pending'
+        job.attempts -= 1
+        job.error = str(exc)
+        job.next_attempt_at = timezone.now() + timedelta(seconds=settings.PREDICTION_CIRCUIT_RESET_TIMEOUT)
+        job.save(update_fields=['status', 'attempts', 'error', 'next_attempt_at'])
+        return job
+    except Exception as exc:
+        if job.attempts >= settings.PREDICTION_JOB_MAX_ATTEMPTS:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+        else:
+            job.status = 'pending'
+            job.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        job.error = str(exc)
+        job.save(update_fields=['status', 'error', 'finished_at', 'next_attempt_at'])
+        return job
+
+    report.result = result['class']
+    report.save(update_fields=['result'])
+    if not cached:
+        prediction_cache.store(report.image_sha256, report.result, report.image.name)
+    if settings.THUMBNAIL_EAGER:
+        generate_report_thumbnails(report)
+    job.status = 'done'
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
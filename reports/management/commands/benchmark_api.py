@@ -0,0 +1,109 @@
+import json
+import shutil
+import tempfile
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+
+from accounts.models import CustomUser
+from reports import prediction
+from reports.benchmarking import SCENARIOS, BenchmarkContext, benchmark_route, compare, route_names
+from reports.seeding import ensure_seed_files
+from reports.stub_predictor import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every named route in accounts/urls.py and reports/urls.py in-process and report '
+        'p50/p95/p99 latency, throughput and queries per request. Run it against a seeded, '
+        'disposable database (manage.py seed_data): write routes create and modify rows. Uploads '
+        'go to an in-process stub predictor unless --predictor-url is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Threads issuing requests.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per route first.')
+        parser.add_argument('--route', action='append', dest='routes', help='Only this route name (repeatable).')
+        parser.add_argument('--predictor-latency', type=float, default=0.05, help='Stub predictor delay in seconds.')
+        parser.add_argument('--predictor-url', help='Use this prediction service instead of the stub.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Print the change against a previous --output file.')
+
+    def handle(self, *args, **options):
+        doctor = (
+            CustomUser.objects.filter(user_type='doctor', doctor_code__isnull=False)
+            .annotate(patient_count=Count('patients'))
+            .order_by('-patient_count')
+            .first()
+        )
+        patient = CustomUser.objects.filter(user_type='user', assigned_doctor=doctor).order_by('id').first()
+        if doctor is None or patient is None:
+            raise CommandError('No data to benchmark; run `manage.py seed_data` first.')
+
+        names = options['routes'] or route_names()
+        unknown = [name for name in names if name not in SCENARIOS]
+        if options['routes'] and unknown:
+            raise CommandError(f"No scenario for route(s): {', '.join(unknown)}")
+
+        server = None
+        predictor_url = options['predictor_url']
+        if not predictor_url:
+            server = make_server(port=0, latency=options['predictor_latency'])
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            predictor_url = f'http://127.0.0.1:{server.server_address[1]}/predict'
+
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        results = {
+            'meta': {
+                'database': connection.vendor,
+                'users': CustomUser.objects.count(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'predictor': predictor_url if options['predictor_url'] else f"stub, {options['predictor_latency']} s",
+            },
+            'routes': {},
+            'unbenchmarked': unknown,
+        }
+        try:
+            # Throttles would turn most login and register samples into 429s.
+            # Uploads go to a throwaway MEDIA_ROOT, not the project's media.
+            with override_settings(PREDICTION_SERVICE_URL=predictor_url, PREDICTION_BATCH_URL=predictor_url + '/batch',
+                                   THROTTLE_BUCKETS={}, MEDIA_ROOT=media_root):
+                prediction.reset_clients()
+                ensure_seed_files()
+                context = BenchmarkContext(doctor, patient)
+                for name in names:
+                    if name not in SCENARIOS:
+                        continue
+                    row = benchmark_route(context, name, options['requests'], options['concurrency'], options['warmup'])
+                    results['routes'][name] = row
+                    self.stdout.write(
+                        f"{name:32} p50 {row['p50_ms']:9.2f} ms  p95 {row['p95_ms']:9.2f} ms  "
+                        f"p99 {row['p99_ms']:9.2f} ms  {row['throughput_rps']:8.1f} req/s  "
+                        f"{row['queries_per_request']:5.1f} q/req  {row['statuses']}"
+                    )
+        finally:
+            prediction.reset_clients()
+            shutil.rmtree(media_root, ignore_errors=True)
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        for name in unknown:
+            self.stdout.write(self.style.WARNING(f'{name}: no scenario, not benchmarked'))
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                changes = compare(json.load(baseline), results)
+            self.stdout.write(self.style.MIGRATE_HEADING('Change against baseline (%)'))
+            for name, row in changes.items():
+                self.stdout.write(f'{name:32} ' + '  '.join(f'{metric} {value:+}' for metric, value in row.items()
+                                                             if value is not None))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
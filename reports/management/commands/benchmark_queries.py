@@ -0,0 +1,83 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from accounts.models import CustomUser
+from reports.models import Report, PatientReport, PatientMessage
+from reports.stats import stats_query
+
+
+def hot_queries(doctor, patient):
+    # The statements behind the list and dashboard endpoints, as the views
+    # and the cursor paginator issue them.
+    page = 51
+    return {
+        'reports (doctor)': Report.objects.order_by('-created_at', '-id')[:page],
+        'reports (patient)': Report.objects.filter(user=patient).order_by('-created_at', '-id')[:page],
+        'microscopic reports (patient)': Report.objects.filter(
+            user=patient, verified=True, doctor__isnull=False
+        ).order_by('-created_at', '-id')[:page],
+        'doctor stats': stats_query([doctor.pk]),
+        'uploaded reports (doctor)': PatientReport.objects.filter(doctor=doctor).order_by('-uploaded_at', '-id')[:page],
+        'uploaded reports (patient)': PatientReport.objects.filter(patient=patient).order_by('-uploaded_at', '-id')[:page],
+        'messages (doctor)': PatientMessage.objects.filter(doctor=doctor).order_by('-created_at', '-id')[:page],
+        'unread messages (doctor)': PatientMessage.objects.filter(doctor=doctor, is_read=False).order_by('-created_at')[:page],
+        'unread counts (doctor)': PatientMessage.objects.filter(doctor=doctor, is_read=False)
+        .values_list('priority').annotate(Count('id')).order_by(),
+        'patients (doctor)': CustomUser.objects.filter(assigned_doctor=doctor).order_by('-date_joined', '-id')[:page],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the query plan and latency of the hot report queries. Run it against a seeded '
+        'database (manage.py seed_data) before and after `migrate reports 0007` to compare plans '
+        'with and without the access-pattern indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Timed executions per query.')
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+        parser.add_argument('--no-plan', action='store_true', help='Skip printing query plans.')
+
+    def handle(self, *args, **options):
+        doctor = (
+            CustomUser.objects.filter(user_type='doctor')
+            .annotate(patient_count=Count('patients'))
+            .order_by('-patient_count')
+            .first()
+        )
+        patient = (
+            CustomUser.objects.filter(user_type='user', assigned_doctor=doctor)
+            .annotate(report_count=Count('reports'))
+            .order_by('-report_count')
+            .first()
+        )
+        if doctor is None or patient is None:
+            raise CommandError('No data to benchmark; run `manage.py seed_data` first.')
+
+        results = {}
+        for name, queryset in hot_queries(doctor, patient).items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = queryset.explain()
+            results[name] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+                'plan': plan,
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  median {results[name]['median_ms']} ms, max {results[name]['max_ms']} ms")
+            if not options['no_plan']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'  {line}')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,102 @@
+import asyncio
+import io
+import json
+import time
+from collections import Counter
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from accounts.authentication import ClaimsRefreshToken
+from accounts.models import CustomUser
+from reports.benchmarking import percentile
+
+
+def sample_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (256, 256), (200, 30, 30)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+async def run_load(url, token, image, total, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    statuses = Counter()
+
+    async def one(client, index):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    url,
+                    headers={'Authorization': f'Bearer {token}'},
+                    data={'result': 'benchmark'},
+                    files={'image': (f'bench-{index}.jpg', image, 'image/jpeg')},
+                )
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        await asyncio.gather(*(one(client, index) for index in range(total)))
+    return time.perf_counter() - started, sorted(timings), statuses
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent report uploads at a running server and report throughput and latency '
+        'percentiles. Compare the sync and async upload paths under the same slow predictor, e.g. '
+        '`gunicorn leukemia_detection.wsgi -w 4` with --path /api/upload/ against '
+        '`uvicorn leukemia_detection.asgi:application --workers 1` with --path /api/async/upload/, '
+        'with PREDICTION_CACHE_ENABLED = False so every upload reaches the predictor.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Upload endpoint to drive (repeatable). Default: /api/upload/ and /api/async/upload/.')
+        parser.add_argument('--username', help='Patient to upload as (default: the first patient).')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        patients = CustomUser.objects.filter(user_type='user')
+        if options['username']:
+            patients = patients.filter(username=options['username'])
+        patient = patients.order_by('id').first()
+        if patient is None:
+            raise CommandError('No patient to upload as; run `manage.py seed_data` first.')
+        token = str(ClaimsRefreshToken.for_user(patient).access_token)
+        image = sample_image()
+
+        results = {}
+        for path in options['paths'] or ['/api/upload/', '/api/async/upload/']:
+            url = options['base_url'].rstrip('/') + path
+            elapsed, timings, statuses = asyncio.run(
+                run_load(url, token, image, options['requests'], options['concurrency'])
+            )
+            results[path] = {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'seconds': round(elapsed, 3),
+                'throughput_rps': round(options['requests'] / elapsed, 2),
+                'p50_ms': round(percentile(timings, 50), 1),
+                'p95_ms': round(percentile(timings, 95), 1),
+                'p99_ms': round(percentile(timings, 99), 1),
+                'statuses': {str(key): count for key, count in statuses.items()},
+            }
+            row = results[path]
+            self.stdout.write(self.style.MIGRATE_HEADING(path))
+            self.stdout.write(
+                f"  {row['throughput_rps']} req/s, p50 {row['p50_ms']} ms, p95 {row['p95_ms']} ms, "
+                f"p99 {row['p99_ms']} ms, statuses {row['statuses']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reports.exporting import EXPORTS, export, for_doctor
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream reports, patient reports or messages to a CSV or NDJSON file, optionally gzipped. Rows are read '
+        'in chunks, so memory use does not depend on the size of the export.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for stdout (default).")
+        parser.add_argument('--gzip', action='store_true', help='Compress the output.')
+        parser.add_argument('--doctor', type=int, help="Only this doctor's rows.")
+        parser.add_argument('--chunk-size', type=int, help='Rows per database round trip (default: EXPORT_CHUNK_SIZE).')
+
+    def handle(self, *args, **options):
+        model, _ = EXPORTS[options['kind']]
+        queryset = model.objects.all()
+        if options['doctor']:
+            queryset = for_doctor(queryset, options['kind'], options['doctor'])
+        chunks = export(queryset, options['kind'], options['format'], options['gzip'], options['chunk_size'])
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+        try:
+            with open(options['output'], 'wb') as stream:
+                written = sum(stream.write(chunk) for chunk in chunks)
+        except OSError as exc:
+            raise CommandError(f"Cannot write {options['output']}: {exc}")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reports.events import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete delivered user events older than the retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep this many days (default: USER_EVENT_RETENTION_DAYS).')
+
+    def handle(self, *args, **options):
+        deleted = prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} event(s).'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reports.stats import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized per-doctor report counters from the report tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors', help='Only rebuild this doctor id (repeatable).')
+
+    def handle(self, *args, **options):
+        rows = rebuild_counters(options['doctors'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {len(rows)} doctor(s).'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from reports.search import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the full-text search documents from reports, messages and patients. Needed once after '
+        'migrating existing data and after bulk loads that bypass model signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', choices=sorted(SOURCES),
+                            help='Only rebuild this kind (repeatable).')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rebuild(options['kinds'], options['batch_size'], log=lambda message: self.stdout.write(message))
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
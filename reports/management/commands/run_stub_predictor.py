@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from reports.stub_predictor import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a stand-in prediction service on /predict and /predict/batch with configurable '
+        'latency and failure rate, for load tests without the real model.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8000)
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds per request.')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Latency varies by up to this many seconds.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+        parser.add_argument('--no-batch', action='store_true', help='Answer /predict/batch with 404.')
+        parser.add_argument('--verbose', action='store_true', help='Log every request.')
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'], latency=options['latency'], jitter=options['jitter'],
+            error_rate=options['error_rate'], batch=not options['no_batch'], verbose=options['verbose'],
+        )
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f'Stub predictor listening on http://{host}:{port}/predict'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from reports.seeding import SCALES, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-insert synthetic doctors, patients, assignment logs, reports, uploads and messages for '
+        'benchmarking. --scale picks a preset; explicit counts override it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small')
+        parser.add_argument('--doctors', type=int)
+        parser.add_argument('--patients-per-doctor', type=int)
+        parser.add_argument('--reports-per-patient', type=int, default=10)
+        parser.add_argument('--uploads-per-patient', type=int, default=1)
+        parser.add_argument('--messages-per-patient', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        scale = SCALES[options['scale']]
+        seed(
+            doctors=options['doctors'] or scale['doctors'],
+            patients_per_doctor=options['patients_per_doctor'] or scale['patients_per_doctor'],
+            reports_per_patient=options['reports_per_patient'],
+            uploads_per_patient=options['uploads_per_patient'],
+            messages_per_patient=options['messages_per_patient'],
+            batch_size=options['batch_size'],
+            log=lambda message: self.stdout.write(f'Seeded {message}'),
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
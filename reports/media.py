@@ -0,0 +1,99 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _read_range(storage, name, start, length):
+    with storage.open(name, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, storage, name, cache_control='private, no-cache'):
+    size = storage.size(name)
+    modified = storage.get_modified_time(name)
+    etag = f'"{size:x}-{int(modified.timestamp() * 1e6):x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(modified.timestamp()),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')) or request.headers.get('If-None-Match') == '*':
+        response = HttpResponseNotModified()
+    elif settings.PROTECTED_MEDIA_BACKEND == 'x-accel-redirect':
+        # nginx serves the bytes from an `internal` location aliasing MEDIA_ROOT.
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_INTERNAL_PREFIX + name
+    elif settings.PROTECTED_MEDIA_BACKEND == 'x-sendfile':
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        response = _stream(request, storage, name, size, etag)
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _stream(request, storage, name, size, etag):
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    match = RANGE_RE.match(request.headers.get('Range', ''))
+    # A stale If-Range means the client's partial copy is outdated: send it all.
+    if_range = request.headers.get('If-Range')
+    if not match or (if_range and if_range != etag):
+        return FileResponse(storage.open(name, 'rb'), content_type=content_type, filename=os.path.basename(name))
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        start, end = 0, -1
+    if start > end or start >= size:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    response = StreamingHttpResponse(_read_range(storage, name, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    return response
+
+
+class ProtectedMediaView(generics.GenericAPIView):
+    # Serves one file field of an object the requesting user may access.
+    permission_classes = (IsAuthenticated,)
+    file_field = None
+    cache_control = 'private, no-cache'
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response is raw bytes, so any Accept header is acceptable.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_file(self, obj):
+        return getattr(obj, self.file_field)
+
+    def get(self, request, *args, **kwargs):
+        field_file = self.get_file(self.get_object())
+        if not field_file:
+            return HttpResponse(status=404)
+        return serve_file(request, field_file.storage, field_file.name, self.cache_control)
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_predictionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=32)),
+                ('result', models.CharField(max_length=100)),
+                ('image', models.ImageField(upload_to='uploads/')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='image_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='predictioncacheentry',
+            constraint=models.UniqueConstraint(fields=('sha256', 'model_version'), name='unique_prediction_per_image_and_model'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_assigned_doctor_customuser_doctor_code_and_more'),
+        ('reports', '0006_predictioncacheentry_report_image_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorReportCounters',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='report_counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending_microscopic', models.IntegerField(default=0)),
+                ('verified_microscopic', models.IntegerField(default=0)),
+                ('pending_uploaded', models.IntegerField(default=0)),
+                ('verified_uploaded', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
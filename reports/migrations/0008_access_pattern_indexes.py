@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0007_doctorreportcounters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientmessage',
+            index=models.Index(fields=['doctor', 'is_read', '-created_at'], name='message_doctor_read_created'),
+        ),
+        migrations.AddIndex(
+            model_name='patientmessage',
+            index=models.Index(fields=['doctor', '-created_at', '-id'], name='message_doctor_created'),
+        ),
+        migrations.AddIndex(
+            model_name='patientmessage',
+            index=models.Index(fields=['patient', '-created_at', '-id'], name='message_patient_created'),
+        ),
+        migrations.AddIndex(
+            model_name='patientreport',
+            index=models.Index(fields=['doctor', 'verified'], name='patientreport_doctor_verified'),
+        ),
+        migrations.AddIndex(
+            model_name='patientreport',
+            index=models.Index(fields=['doctor', '-uploaded_at', '-id'], name='patientreport_doctor_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='patientreport',
+            index=models.Index(fields=['patient', '-uploaded_at', '-id'], name='patientreport_patient_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='patientreport',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['doctor'], name='patientreport_unverified'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', 'verified', 'doctor'], name='report_user_verified_doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='report_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['-created_at', '-id'], name='report_created'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('verified', False)), fields=['user'], name='report_unverified_user'),
+        ),
+    ]
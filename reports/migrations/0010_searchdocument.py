@@ -0,0 +1,108 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.utils import OperationalError
+
+# The full-text index mirrors reports_searchdocument. On SQLite it is an
+# external-content FTS5 table over a view (the scope column is derived from
+# doctor_id) kept in sync by triggers; on PostgreSQL a generated tsvector
+# column with a GIN index. Other databases fall back to LIKE queries.
+# A later migration that makes SQLite rebuild reports_searchdocument drops
+# the triggers with it and must recreate them.
+SQLITE_INDEX = [
+    """CREATE VIRTUAL TABLE reports_searchindex USING fts5(
+       scope, title, body, content='reports_searchcontent', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')""",
+    """CREATE VIEW reports_searchcontent AS
+       SELECT id, 'd' || doctor_id AS scope, title, body FROM reports_searchdocument""",
+    """CREATE TRIGGER reports_searchdocument_ai AFTER INSERT ON reports_searchdocument BEGIN
+       INSERT INTO reports_searchindex(rowid, scope, title, body)
+       VALUES (new.id, 'd' || new.doctor_id, new.title, new.body);
+       END""",
+    """CREATE TRIGGER reports_searchdocument_ad AFTER DELETE ON reports_searchdocument BEGIN
+       INSERT INTO reports_searchindex(reports_searchindex, rowid, scope, title, body)
+       VALUES ('delete', old.id, 'd' || old.doctor_id, old.title, old.body);
+       END""",
+    """CREATE TRIGGER reports_searchdocument_au AFTER UPDATE ON reports_searchdocument BEGIN
+       INSERT INTO reports_searchindex(reports_searchindex, rowid, scope, title, body)
+       VALUES ('delete', old.id, 'd' || old.doctor_id, old.title, old.body);
+       INSERT INTO reports_searchindex(rowid, scope, title, body)
+       VALUES (new.id, 'd' || new.doctor_id, new.title, new.body);
+       END""",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS reports_searchdocument_au',
+    'DROP TRIGGER IF EXISTS reports_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS reports_searchdocument_ai',
+    'DROP TABLE IF EXISTS reports_searchindex',
+    'DROP VIEW IF EXISTS reports_searchcontent',
+]
+POSTGRESQL_INDEX = [
+    """ALTER TABLE reports_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+       setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+       setweight(to_tsvector('simple', coalesce(body, '')), 'B')) STORED""",
+    'CREATE INDEX reports_searchdocument_vector ON reports_searchdocument USING gin (search_vector)',
+]
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS reports_searchdocument_vector',
+    'ALTER TABLE reports_searchdocument DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(SQLITE_INDEX[0])
+        except OperationalError:
+            return  # SQLite built without FTS5.
+        _execute(schema_editor, SQLITE_INDEX[1:])
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRESQL_INDEX)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _execute(schema_editor, SQLITE_DROP)
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRESQL_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0009_userevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('message', 'Message'), ('report', 'Report'), ('patient', 'Patient')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(blank=True, default='', max_length=300)),
+                ('body', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField()),
+                ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'kind', '-created_at'], name='searchdoc_doctor_kind_created'), models.Index(fields=['patient', 'kind'], name='searchdoc_patient_kind')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document'),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0010_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patientmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['doctor', 'priority'], name='message_unread_priority'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0011_message_unread_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='gradcam_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('reports', '0013_predictionjob_next_attempt_at'),
+    ]
+
+    # The replacement index is built before the indexes it supersedes go.
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user', 'verified'], name='report_user_verified'),
+        ),
+        migrations.RemoveIndex(
+            model_name='patientmessage',
+            name='message_doctor_read_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='patientreport',
+            name='patientreport_unverified',
+        ),
+        migrations.RemoveIndex(
+            model_name='report',
+            name='report_user_verified_doctor',
+        ),
+        migrations.RemoveIndex(
+            model_name='report',
+            name='report_unverified_user',
+        ),
+        migrations.AlterField(
+            model_name='patientmessage',
+            name='doctor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='received_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='patientmessage',
+            name='patient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sent_messages', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='patientreport',
+            name='doctor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='received_reports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='patientreport',
+            name='patient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_reports', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reports', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,19 +1,36 @@
 from django.db import models
 from accounts.models import CustomUser
+from leukemia_detection.mixins import LoadedValuesMixin
 
-class Report(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reports')
+class Report(LoadedValuesMixin, models.Model):
+    # Indexed by report_user_created and report_user_verified, which lead with it.
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='reports', db_index=False)
     doctor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_reports')
     image = models.ImageField(upload_to='uploads/')
+    image_sha256 = models.CharField(max_length=64, blank=True, default='')
     result = models.CharField(max_length=100)
     gradcam_image = models.ImageField(upload_to='gradcam/', blank=True, null=True)
+    gradcam_sha256 = models.CharField(max_length=64, blank=True, default='')
     verified = models.BooleanField(default=False)
     sent_to_patient = models.BooleanField(default=False)
     sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     comments = models.TextField(blank=True, null=True)
 
-class PatientMessage(models.Model):
+    tracked_fields = ('user_id', 'verified', 'sent_to_patient', 'result', 'comments', 'gradcam_image')
+
+    class Meta:
+        # One per access pattern; `manage.py benchmark_queries` prints the plans.
+        indexes = [
+            # Doctor stats: SEARCH USING COVERING INDEX report_user_verified (user_id=?)
+            models.Index(fields=['user', 'verified'], name='report_user_verified'),
+            # A patient's reports: SEARCH USING INDEX report_user_created (user_id=?)
+            models.Index(fields=['user', '-created_at', '-id'], name='report_user_created'),
+            # All reports, newest first: SCAN USING INDEX report_created
+            models.Index(fields=['-created_at', '-id'], name='report_created'),
+        ]
+
+class PatientMessage(LoadedValuesMixin, models.Model):
     PRIORITY_CHOICES = [
         ('low', 'Low'),
         ('normal', 'Normal'),
@@ -21,24 +38,152 @@ class PatientMessage(models.Model):
         ('urgent', 'Urgent'),
     ]
 
-    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_messages')
-    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_messages')
+    # Both are indexed by the composites below, which lead with them.
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sent_messages', db_index=False)
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_messages', db_index=False)
     subject = models.CharField(max_length=200)
     message = models.TextField()
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='normal')
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    tracked_fields = ('is_read', 'subject', 'message')
+
+    class Meta:
+        indexes = [
+            # A doctor's messages, all or unread: SEARCH USING INDEX message_doctor_created (doctor_id=?)
+            models.Index(fields=['doctor', '-created_at', '-id'], name='message_doctor_created'),
+            # A patient's messages: SEARCH USING INDEX message_patient_created (patient_id=?)
+            models.Index(fields=['patient', '-created_at', '-id'], name='message_patient_created'),
+            # Only unread rows, for the inbox badges' counts per doctor and
+            # priority: SEARCH USING INDEX message_unread_priority (doctor_id=?)
+            models.Index(fields=['doctor', 'priority'], condition=models.Q(is_read=False), name='message_unread_priority'),
+        ]
+
     def __str__(self):
         return f"Message from {self.patient.username} to {self.doctor.username}: {self.subject}"
 
-class PatientReport(models.Model):
-    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploaded_reports')
-    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_reports')
+class PatientReport(LoadedValuesMixin, models.Model):
+    # Both are indexed by the composites below, which lead with them.
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploaded_reports', db_index=False)
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='received_reports', db_index=False)
     report_file = models.FileField(upload_to='reports/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     verified = models.BooleanField(default=False)
     comments = models.TextField(blank=True, null=True)
 
+    tracked_fields = ('doctor_id', 'verified')
+
+    class Meta:
+        indexes = [
+            # Doctor stats: SEARCH USING COVERING INDEX patientreport_doctor_verified (doctor_id=?)
+            models.Index(fields=['doctor', 'verified'], name='patientreport_doctor_verified'),
+            # A doctor's uploads: SEARCH USING INDEX patientreport_doctor_uploaded (doctor_id=?)
+            models.Index(fields=['doctor', '-uploaded_at', '-id'], name='patientreport_doctor_uploaded'),
+            # A patient's uploads: SEARCH USING INDEX patientreport_patient_uploaded (patient_id=?)
+            models.Index(fields=['patient', '-uploaded_at', '-id'], name='patientreport_patient_uploaded'),
+        ]
+
     def __str__(self):
         return f"Report by {self.patient.username} for {self.doctor.username}"
+
+class PredictionJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    report = models.OneToOneField(Report, on_delete=models.CASCADE, related_name='prediction_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)  # a failed job waits until then
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Prediction job {self.id} for report {self.report_id}: {self.status}"
+
+class PredictionCacheEntry(models.Model):
+    sha256 = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=32)
+    result = models.CharField(max_length=100)
+    image = models.ImageField(upload_to='uploads/')
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'model_version'], name='unique_prediction_per_image_and_model'),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.model_version}): {self.result}"
+
+class DoctorReportCounters(models.Model):
+    doctor = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='report_counters')
+    pending_microscopic = models.IntegerField(default=0)
+    verified_microscopic = models.IntegerField(default=0)
+    pending_uploaded = models.IntegerField(default=0)
+    verified_uploaded = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Report counters for {self.doctor_id}"
+
+class UserEvent(models.Model):
+    # Append-only feed of changes pushed to one user; the id is the cursor
+    # clients resume from.
+    KIND_CHOICES = [
+        ('message_created', 'Message created'),
+        ('messages_read', 'Messages read'),
+        ('report_verified', 'Report verified'),
+        ('report_sent', 'Report sent'),
+        ('patient_report_uploaded', 'Patient report uploaded'),
+        ('patient_report_verified', 'Patient report verified'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='userevent_user_id'),
+        ]
+
+class SearchDocument(models.Model):
+    # One row per searchable object, flattened to a title and a body and
+    # scoped to the doctor who may find it. Migration 0010 mirrors it into
+    # the database's full-text index (an FTS5 table on SQLite, a tsvector
+    # column on PostgreSQL); see reports.search.
+    KIND_CHOICES = [
+        ('message', 'Message'),
+        ('report', 'Report'),
+        ('patient', 'Patient'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    doctor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='+')
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=300, blank=True, default='')
+    body = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'kind', '-created_at'], name='searchdoc_doctor_kind_created'),
+            models.Index(fields=['patient', 'kind'], name='searchdoc_patient_kind'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
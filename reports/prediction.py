@@ -0,0 +1,368 @@
+import asyncio
+import os
+import secrets
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from leukemia_detection.metrics import prediction_timer
+
+
+class PredictionError(Exception):
+    pass
+
+
+class PredictionUnavailable(PredictionError):
+    # Raised without touching the network while the circuit is open.
+    pass
+
+
+def multipart_stream(fields, boundary, chunk_size=64 * 1024):
+    # Encodes multipart/form-data lazily so requests sends it with chunked
+    # transfer encoding; building it with `files=` would hold every upload
+    # in memory at once.
+    for name, stream in fields:
+        filename = os.path.basename(getattr(stream, 'name', None) or name)
+        content_type = getattr(stream, 'content_type', None) or 'application/octet-stream'
+        yield (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode()
+
+
+class BatchNotSupported(PredictionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            # Once the reset timeout has passed, let a single trial call through.
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        # Ends a trial without an outcome, e.g. when the upload could not be
+        # read: that says nothing about the service.
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self.lock:
+            self.samples.append(seconds)
+            self.calls += 1
+            if not ok:
+                self.failures += 1
+
+    def snapshot(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            calls, failures = self.calls, self.failures
+
+        def percentile(p):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {
+            'calls': calls,
+            'failures': failures,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(samples[-1] * 1000, 2) if samples else None,
+        }
+
+
+class PredictionClient:
+    # POST is not idempotent: only retry when the predictor cannot have done
+    # the work, i.e. no connection or a gateway/overload answer.
+    RETRYABLE_STATUSES = (502, 503, 504)
+    BATCH_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+    def __init__(self, url, batch_url=None, connect_timeout=3.05, read_timeout=30, max_retries=2, retry_backoff=0.5,
+                 pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.url = url
+        self.batch_url = batch_url or url.rstrip('/') + '/batch'
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = LatencyStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def predict(self, image):
+        return self._call(self.url, [('file', image)])
+
+    def predict_batch(self, images):
+        results = self._call(self.batch_url, [('files', image) for image in images])
+        if isinstance(results, dict):
+            results = results.get('results')
+        if not isinstance(results, list) or len(results) != len(images):
+            raise PredictionError("Batch prediction returned a mismatched number of results")
+        return results
+
+    def _call(self, url, fields):
+        if not self.breaker.allow():
+            raise PredictionUnavailable("Prediction service is unavailable")
+
+        # Only the predictor's own failures count against the breaker. Local
+        # errors, such as an unreadable upload, release a half-open trial
+        # without an outcome.
+        settled = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                for _, stream in fields:
+                    if hasattr(stream, 'seek'):
+                        stream.seek(0)
+                boundary = secrets.token_hex(16)
+                started = time.perf_counter()
+                try:
+                    response = self.session.post(
+                        url,
+                        data=multipart_stream(fields, boundary),
+                        headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+                        timeout=self.timeout,
+                    )
+                except requests.RequestException as exc:
+                    self.stats.record(time.perf_counter() - started, ok=False)
+                    # Connection failures (ConnectTimeout included) are safe to retry.
+                    if isinstance(exc, requests.ConnectionError) and attempt < self.max_retries:
+                        continue
+                    settled = True
+                    self.breaker.record_failure()
+                    raise PredictionError(f"Prediction request failed: {exc}")
+
+                self.stats.record(time.perf_counter() - started, ok=response.status_code == 200)
+                # handle_response records the outcome unless it asks for a retry.
+                settled = True
+                payload, error = self.handle_response(url, response)
+                if error is None:
+                    return payload
+                settled = False
+            settled = True
+            self.breaker.record_failure()
+            raise error
+        finally:
+            if not settled:
+                self.breaker.release()
+
+    def handle_response(self, url, response):
+        # Returns (payload, None) on success or (None, error) when retrying
+        # may help; raises when it cannot. Works for requests and httpx.
+        if response.status_code == 200:
+            try:
+                payload = response.json()
+            except ValueError:
+                self.breaker.record_failure()
+                raise PredictionError("Prediction service returned invalid JSON")
+            self.breaker.record_success()
+            return payload, None
+        if url == self.batch_url and response.status_code in self.BATCH_UNSUPPORTED_STATUSES:
+            self.breaker.record_success()
+            raise BatchNotSupported(f"Batch endpoint answered {response.status_code}")
+        error = PredictionError(f"Prediction failed with status {response.status_code}")
+        if response.status_code not in self.RETRYABLE_STATUSES and response.status_code < 500:
+            # The predictor answered; the request itself was rejected.
+            self.breaker.record_success()
+            raise error
+        return None, error
+
+    def status(self):
+        return {
+            'url': self.url,
+            'circuit': self.breaker.state,
+            'latency': self.stats.snapshot(),
+        }
+
+
+async def _aiter(iterable):
+    # Each chunk is produced on a worker thread, so the file reads behind
+    # multipart_stream never block the event loop.
+    iterator = iter(iterable)
+    pull = sync_to_async(next, thread_sensitive=False)
+    while (chunk := await pull(iterator, None)) is not None:
+        yield chunk
+
+
+class AsyncPredictionClient:
+    # Async counterpart of PredictionClient for the ASGI views: a request
+    # waiting on the predictor holds a coroutine instead of a worker thread.
+    # Shares the sync client's circuit breaker and latency stats, since both
+    # talk to the same service.
+
+    def __init__(self, client, pool_size=100, transport=None):
+        self.client = client
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.transport = transport
+        # httpx clients are bound to the event loop they were first used on.
+        self.sessions = weakref.WeakKeyDictionary()
+
+    def session(self):
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None:
+            connect_timeout, read_timeout = self.client.timeout
+            session = httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout), limits=self.limits, transport=self.transport,
+            )
+            self.sessions[loop] = session
+        return session
+
+    async def predict(self, image):
+        with prediction_timer():
+            return await self._call(self.client.url, [('file', image)])
+
+    async def _call(self, url, fields):
+        client = self.client
+        if not client.breaker.allow():
+            raise PredictionUnavailable("Prediction service is unavailable")
+
+        # As in PredictionClient._call: only the predictor's failures count.
+        settled = False
+        try:
+            for attempt in range(client.max_retries + 1):
+                if attempt:
+                    await asyncio.sleep(client.retry_backoff * 2 ** (attempt - 1))
+                for _, stream in fields:
+                    if hasattr(stream, 'seek'):
+                        stream.seek(0)
+                boundary = secrets.token_hex(16)
+                started = time.perf_counter()
+                try:
+                    response = await self.session().post(
+                        url,
+                        content=_aiter(multipart_stream(fields, boundary)),
+                        headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+                    )
+                except httpx.HTTPError as exc:
+                    client.stats.record(time.perf_counter() - started, ok=False)
+                    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout)) and attempt < client.max_retries:
+                        continue
+                    settled = True
+                    client.breaker.record_failure()
+                    raise PredictionError(f"Prediction request failed: {exc}")
+
+                client.stats.record(time.perf_counter() - started, ok=response.status_code == 200)
+                settled = True
+                payload, error = client.handle_response(url, response)
+                if error is None:
+                    return payload
+                settled = False
+            settled = True
+            client.breaker.record_failure()
+            raise error
+        finally:
+            if not settled:
+                client.breaker.release()
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PredictionClient(
+                    settings.PREDICTION_SERVICE_URL,
+                    batch_url=settings.PREDICTION_BATCH_URL,
+                    connect_timeout=settings.PREDICTION_CONNECT_TIMEOUT,
+                    read_timeout=settings.PREDICTION_READ_TIMEOUT,
+                    max_retries=settings.PREDICTION_MAX_RETRIES,
+                    retry_backoff=settings.PREDICTION_RETRY_BACKOFF,
+                    pool_size=settings.PREDICTION_POOL_SIZE,
+                    failure_threshold=settings.PREDICTION_CIRCUIT_FAILURE_THRESHOLD,
+                    reset_timeout=settings.PREDICTION_CIRCUIT_RESET_TIMEOUT,
+                )
+    return _client
+
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        client = get_client()
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncPredictionClient(client, pool_size=settings.PREDICTION_ASYNC_POOL_SIZE)
+    return _async_client
+
+
+def reset_clients():
+    # Drops the cached clients so the next call picks up changed settings.
+    global _client, _async_client
+    with _client_lock:
+        _client = _async_client = None
+
+
+def predict_image(image):
+    with prediction_timer():
+        if settings.PREDICTION_BATCH_WINDOW > 0:
+            from .batching import get_batcher
+            return get_batcher().predict(image)
+        return get_client().predict(image)
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PredictionCacheEntry
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+# Hits not yet written to their entry, by entry id.
+_pending_hits = {}
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def hash_file(image):
+    if getattr(image, 'sha256', None):
+        # Already computed by StreamingUploadHandler while the upload arrived.
+        return image.sha256
+    sha256 = hashlib.sha256()
+    for chunk in image.chunks():
+        sha256.update(chunk)
+    image.seek(0)
+    return sha256.hexdigest()
+
+
+def lookup(sha256):
+    if not settings.PREDICTION_CACHE_ENABLED or not sha256:
+        return None
+    entry = PredictionCacheEntry.objects.filter(
+        sha256=sha256, model_version=settings.PREDICTION_MODEL_VERSION
+    ).first()
+    if entry is not None and not entry.image.storage.exists(entry.image.name):
+        # The stored image is gone, so reports cannot share it any more.
+        entry.delete()
+        entry = None
+    if entry is None:
+        _count('misses')
+        return None
+    _touch(entry)
+    _count('hits')
+    return entry
+
+
+def _touch(entry):
+    # An UPDATE per hit would add a write to every cached upload. Hits are
+    # counted in memory and written, with the LRU timestamp, at most once
+    # per PREDICTION_CACHE_TOUCH_INTERVAL for each entry.
+    now = timezone.now()
+    with _counters_lock:
+        hits = _pending_hits.pop(entry.pk, 0) + 1
+        if (now - entry.last_used_at).total_seconds() < settings.PREDICTION_CACHE_TOUCH_INTERVAL:
+            _pending_hits[entry.pk] = hits
+            return
+    PredictionCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + hits, last_used_at=now)
+
+
+def store(sha256, result, image_name):
+    if not settings.PREDICTION_CACHE_ENABLED or not sha256:
+        return
+    try:
+        with transaction.atomic():
+            entry = PredictionCacheEntry.objects.create(
+                sha256=sha256,
+                model_version=settings.PREDICTION_MODEL_VERSION,
+                result=result,
+                image=image_name,
+            )
+    except IntegrityError:
+        # Another worker cached the same image first.
+        return
+    if entry.pk % settings.PREDICTION_CACHE_EVICT_EVERY == 0:
+        evict()
+
+
+def evict(batch_size=1000):
+    # Deletes whatever lies past the newest PREDICTION_CACHE_MAX_ENTRIES by
+    # last use, at most batch_size rows. Finding them walks the cap's worth
+    # of the last_used_at index, so store() only calls this once every
+    # PREDICTION_CACHE_EVICT_EVERY inserts and the table may briefly exceed
+    # the cap by that much. The image files stay, since reports still point
+    # at them.
+    limit = settings.PREDICTION_CACHE_MAX_ENTRIES
+    stale = list(PredictionCacheEntry.objects.order_by('-last_used_at', '-id')
+                 .values_list('id', flat=True)[limit:limit + batch_size])
+    if stale:
+        PredictionCacheEntry.objects.filter(id__in=stale).delete()
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_ratio'] = round(counters['hits'] / lookups, 3) if lookups else None
+    counters['entries'] = PredictionCacheEntry.objects.count()
+    return counters
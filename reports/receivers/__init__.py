@@ -0,0 +1,2 @@
+# One module per feature that keeps derived data in step with writes.
+from . import caching, counters, events, search, thumbnails  # noqa: F401
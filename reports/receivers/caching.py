@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from leukemia_detection.caching import invalidate_users
+from ..models import Report, PatientReport, PatientMessage
+from ..signals import UNKNOWN, bulk_changed, previous
+
+
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+def invalidate_report_owner(sender, instance, **kwargs):
+    owner = previous(instance, 'user_id')
+    invalidate_users(instance.user_id, None if owner is UNKNOWN else owner)
+
+
+@receiver(post_save, sender=PatientReport)
+@receiver(post_delete, sender=PatientReport)
+def invalidate_patient_report_owner(sender, instance, **kwargs):
+    invalidate_users(instance.patient_id)
+
+
+@receiver(post_save, sender=PatientMessage)
+@receiver(post_delete, sender=PatientMessage)
+def invalidate_message_parties(sender, instance, **kwargs):
+    invalidate_users(instance.patient_id, instance.doctor_id)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user(sender, instance, **kwargs):
+    # A patient appears in their doctor's patient list, so both the old and
+    # the new doctor's responses go stale.
+    doctor = previous(instance, 'assigned_doctor_id')
+    invalidate_users(instance.pk, instance.assigned_doctor_id, None if doctor is UNKNOWN else doctor)
+
+
+@receiver(bulk_changed, sender=Report)
+def invalidate_bulk_reports(sender, ids, **kwargs):
+    invalidate_users(*Report.objects.filter(id__in=ids).values_list('user_id', flat=True).order_by().distinct())
+
+
+@receiver(bulk_changed, sender=PatientReport)
+def invalidate_bulk_patient_reports(sender, ids, **kwargs):
+    invalidate_users(*PatientReport.objects.filter(id__in=ids).values_list('patient_id', flat=True).order_by().distinct())
+
+
+@receiver(bulk_changed, sender=PatientMessage)
+def invalidate_bulk_messages(sender, ids, **kwargs):
+    for patient_id, doctor_id in PatientMessage.objects.filter(id__in=ids).values_list('patient_id', 'doctor_id').order_by().distinct():
+        invalidate_users(patient_id, doctor_id)
+
+
+@receiver(bulk_changed, sender=CustomUser)
+def invalidate_bulk_users(sender, ids, **kwargs):
+    for user_id, doctor_id in CustomUser.objects.filter(id__in=ids).values_list('id', 'assigned_doctor_id'):
+        invalidate_users(user_id, doctor_id)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from .. import stats
+from ..models import Report, PatientReport
+from ..signals import UNKNOWN, bulk_changed, previous, touches
+
+
+def _state(verified, kind):
+    return f"{'verified' if verified else 'pending'}_{kind}"
+
+
+def _assigned_doctor(patient_id):
+    return CustomUser.objects.filter(pk=patient_id).values_list('assigned_doctor_id', flat=True).first()
+
+
+def _counted_save(instance, created, owner_field, doctor_of, kind):
+    previous_owner = previous(instance, owner_field)
+    previous_verified = previous(instance, 'verified')
+    owner = getattr(instance, owner_field)
+    if created:
+        stats.apply_delta(doctor_of(owner), **{_state(instance.verified, kind): 1})
+    elif previous_owner is UNKNOWN or previous_verified is UNKNOWN or previous_owner != owner:
+        doctors = {doctor_of(owner)}
+        if previous_owner not in (UNKNOWN, None):
+            doctors.add(doctor_of(previous_owner))
+        stats.rebuild_counters(doctors)
+    elif previous_verified != instance.verified:
+        stats.apply_delta(doctor_of(owner), **{
+            _state(previous_verified, kind): -1,
+            _state(instance.verified, kind): 1,
+        })
+
+
+@receiver(post_save, sender=Report)
+def count_report_save(sender, instance, created, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED:
+        _counted_save(instance, created, 'user_id', _assigned_doctor, 'microscopic')
+
+
+@receiver(post_save, sender=PatientReport)
+def count_patient_report_save(sender, instance, created, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED:
+        _counted_save(instance, created, 'doctor_id', lambda doctor_id: doctor_id, 'uploaded')
+
+
+@receiver(post_delete, sender=Report)
+def count_report_delete(sender, instance, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED:
+        stats.apply_delta(_assigned_doctor(instance.user_id), **{_state(instance.verified, 'microscopic'): -1})
+
+
+@receiver(post_delete, sender=PatientReport)
+def count_patient_report_delete(sender, instance, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED:
+        stats.apply_delta(instance.doctor_id, **{_state(instance.verified, 'uploaded'): -1})
+
+
+@receiver(post_save, sender=CustomUser)
+def count_patient_reassignment(sender, instance, created, **kwargs):
+    # A patient's microscopic reports count towards whichever doctor they are
+    # assigned to, so moving a patient shifts counts between two doctors.
+    doctor = previous(instance, 'assigned_doctor_id')
+    if settings.REPORT_STATS_MATERIALIZED and not created and doctor != instance.assigned_doctor_id:
+        doctors = {instance.assigned_doctor_id}
+        if doctor is not UNKNOWN:
+            doctors.add(doctor)
+        stats.rebuild_counters(doctors)
+
+
+@receiver(bulk_changed, sender=Report)
+def count_bulk_reports(sender, ids, fields=None, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED and touches(fields, 'user', 'user_id', 'verified'):
+        doctors = CustomUser.objects.filter(reports__id__in=ids).values_list('assigned_doctor_id', flat=True)
+        stats.rebuild_counters(set(doctors))
+
+
+@receiver(bulk_changed, sender=PatientReport)
+def count_bulk_patient_reports(sender, ids, fields=None, **kwargs):
+    if settings.REPORT_STATS_MATERIALIZED and touches(fields, 'doctor', 'doctor_id', 'verified'):
+        stats.rebuild_counters(set(PatientReport.objects.filter(id__in=ids).values_list('doctor_id', flat=True)))
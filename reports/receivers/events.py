@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .. import events
+from ..models import Report, PatientReport, PatientMessage
+from ..signals import became_true
+
+
+@receiver(post_save, sender=Report)
+def report_events(sender, instance, created, **kwargs):
+    if became_true(instance, 'verified', created):
+        events.record(instance.user_id, 'report_verified', id=instance.id)
+    if became_true(instance, 'sent_to_patient', created):
+        events.record(instance.user_id, 'report_sent', id=instance.id)
+
+
+@receiver(post_save, sender=PatientReport)
+def patient_report_events(sender, instance, created, **kwargs):
+    if created:
+        events.record(instance.doctor_id, 'patient_report_uploaded', id=instance.id, patient_id=instance.patient_id)
+    if became_true(instance, 'verified', created):
+        events.record(instance.patient_id, 'patient_report_verified', id=instance.id)
+
+
+@receiver(post_save, sender=PatientMessage)
+def message_events(sender, instance, created, **kwargs):
+    if created:
+        events.record(instance.doctor_id, 'message_created', id=instance.id, patient_id=instance.patient_id,
+                      priority=instance.priority, unread=events.unread_count(instance.doctor_id))
+    elif became_true(instance, 'is_read', created):
+        events.record(instance.doctor_id, 'messages_read', ids=[instance.id],
+                      unread=events.unread_count(instance.doctor_id))
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from .. import search
+from ..models import Report, PatientMessage
+from ..signals import bulk_changed, changed, touches
+
+
+@receiver(post_save, sender=Report)
+def index_report(sender, instance, created, **kwargs):
+    if changed(instance, created, 'user_id', 'result', 'comments'):
+        search.index('report', [instance.pk])
+
+
+@receiver(post_save, sender=PatientMessage)
+def index_message(sender, instance, created, **kwargs):
+    if changed(instance, created, 'subject', 'message'):
+        search.index('message', [instance.pk])
+
+
+@receiver(post_save, sender=CustomUser)
+def index_patient(sender, instance, created, **kwargs):
+    if instance.user_type != 'user':
+        return
+    if changed(instance, created, 'assigned_doctor_id', 'first_name', 'last_name', 'username', 'email'):
+        search.index('patient', [instance.pk])
+    if not created and changed(instance, created, 'assigned_doctor_id'):
+        search.rescope_patients([instance.pk])
+
+
+@receiver(post_delete, sender=Report)
+def unindex_report(sender, instance, **kwargs):
+    search.unindex('report', [instance.pk])
+
+
+@receiver(post_delete, sender=PatientMessage)
+def unindex_message(sender, instance, **kwargs):
+    search.unindex('message', [instance.pk])
+
+
+@receiver(bulk_changed, sender=Report)
+def index_bulk_reports(sender, ids, fields=None, **kwargs):
+    if touches(fields, 'user', 'user_id', 'result', 'comments'):
+        search.index('report', ids)
+
+
+@receiver(bulk_changed, sender=PatientMessage)
+def index_bulk_messages(sender, ids, fields=None, **kwargs):
+    if touches(fields, 'subject', 'message'):
+        search.index('message', ids)
+
+
+@receiver(bulk_changed, sender=CustomUser)
+def index_bulk_users(sender, ids, **kwargs):
+    search.index('patient', ids)
+    search.rescope_patients(ids)
@@ -0,0 +1,14 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from ..models import Report
+from ..signals import UNKNOWN, previous
+
+
+@receiver(pre_save, sender=Report)
+def forget_gradcam_hash(sender, instance, **kwargs):
+    # The stored digest belongs to the Grad-CAM image that was loaded; a
+    # replacement is hashed again when its thumbnails are needed.
+    loaded = previous(instance, 'gradcam_image')
+    if instance.gradcam_sha256 and loaded is not UNKNOWN and loaded != instance.gradcam_image.name:
+        instance.gradcam_sha256 = ''
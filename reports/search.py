@@ -0,0 +1,212 @@
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+
+from accounts.models import CustomUser
+from .models import Report, PatientMessage, SearchDocument
+
+WORD = re.compile(r'\w+')
+MAX_TERMS = 8
+SNIPPET_WORDS = 16
+
+
+def _report_rows(ids):
+    return Report.objects.filter(id__in=ids).values_list(
+        'id', 'user_id', 'user__assigned_doctor_id', 'result', 'comments', 'created_at'
+    )
+
+
+def _message_rows(ids):
+    return PatientMessage.objects.filter(id__in=ids).values_list(
+        'id', 'patient_id', 'doctor_id', 'subject', 'message', 'created_at'
+    )
+
+
+def _patient_rows(ids):
+    patients = CustomUser.objects.filter(id__in=ids, user_type='user').values_list(
+        'id', 'id', 'assigned_doctor_id', 'first_name', 'last_name', 'username', 'email', 'date_joined'
+    )
+    # Title is the display name; the username and e-mail are searchable too.
+    return [
+        (pk, patient_id, doctor_id, f'{first_name} {last_name}'.strip() or username, f'{username} {email}', joined)
+        for pk, patient_id, doctor_id, first_name, last_name, username, email, joined in patients
+    ]
+
+
+# kind -> function loading (object_id, patient_id, doctor_id, title, body,
+# created_at) rows for the given ids. Reports and patients are scoped to
+# the patient's assigned doctor, messages to the doctor they were sent to.
+SOURCES = {
+    'report': _report_rows,
+    'message': _message_rows,
+    'patient': _patient_rows,
+}
+MODELS = {'report': Report, 'message': PatientMessage, 'patient': CustomUser}
+
+
+def index(kind, ids, batch_size=1000):
+    # Upserts the documents for these objects: one SELECT and one INSERT ...
+    # ON CONFLICT per batch. The database mirrors them into its index.
+    ids = [pk for pk in ids if pk]
+    if not ids:
+        return 0
+    documents = [
+        SearchDocument(kind=kind, object_id=object_id, patient_id=patient_id, doctor_id=doctor_id,
+                       title=(title or '')[:300], body=body or '', created_at=created_at)
+        for object_id, patient_id, doctor_id, title, body, created_at in SOURCES[kind](ids)
+    ]
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=batch_size, update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['patient', 'doctor', 'title', 'body', 'created_at'],
+    )
+    return len(documents)
+
+
+def unindex(kind, ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def rescope_patients(patient_ids):
+    # A reassigned patient's reports follow them to the new doctor.
+    index('report', Report.objects.filter(user_id__in=list(patient_ids)).values_list('id', flat=True))
+
+
+def rebuild(kinds=None, batch_size=5000, log=None):
+    log = log or (lambda message: None)
+    for kind in kinds or SOURCES:
+        model = MODELS[kind]
+        ids = model.objects.filter(user_type='user') if kind == 'patient' else model.objects.all()
+        ids = ids.order_by('id').values_list('id', flat=True)
+        total, batch = 0, []
+        for pk in ids.iterator(chunk_size=batch_size):
+            batch.append(pk)
+            if len(batch) == batch_size:
+                total += index(kind, batch)
+                batch = []
+        total += index(kind, batch)
+        # Documents whose object was removed while signals were bypassed.
+        SearchDocument.objects.filter(kind=kind).exclude(object_id__in=ids).delete()
+        log(f'{total} {kind} documents')
+    if connection.vendor == 'sqlite' and _has_fts(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO reports_searchindex(reports_searchindex) VALUES ('optimize')")
+
+
+def terms(query):
+    return WORD.findall(query.lower())[:MAX_TERMS]
+
+
+def _has_fts(connection):
+    # False when SQLite was built without FTS5 and the migration skipped it.
+    if not hasattr(connection, '_has_search_index'):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'reports_searchindex'")
+            connection._has_search_index = cursor.fetchone() is not None
+    return connection._has_search_index
+
+
+def _fetch(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _kind_filter(column, kinds):
+    if not kinds:
+        return '', []
+    return f' AND {column} IN ({", ".join(["%s"] * len(kinds))})', list(kinds)
+
+
+def _match(words):
+    # Every word must match, the last one as a prefix for search-as-you-type.
+    # Earlier words are exact because a prefix query merges the posting
+    # lists of every indexed term it expands to, across all doctors.
+    return ' AND '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def _search_sqlite(connection, doctor_id, words, kinds, offset, limit):
+    # The doctor is a token in the scope column, so the scope filter is one
+    # more posting list for FTS5 to intersect, not a scan of every match.
+    # Matches in the title (report result, message subject, patient name)
+    # come first, then the rest, newest first within each. bm25() is not
+    # used: it computes term frequencies over the whole index on every
+    # query, which for common words costs more than the search itself.
+    scope, match = f'scope : d{doctor_id}', _match(words)
+    kind_sql, kind_params = _kind_filter('d.kind', kinds)
+    page = _fetch(connection, f"""
+        SELECT d.id FROM (
+            SELECT rowid AS id, 0 AS tier FROM reports_searchindex WHERE reports_searchindex MATCH %s
+            UNION ALL
+            SELECT rowid, 1 FROM reports_searchindex WHERE reports_searchindex MATCH %s
+        ) matches
+        JOIN reports_searchdocument d ON d.id = matches.id
+        WHERE 1 = 1{kind_sql}
+        ORDER BY matches.tier, d.created_at DESC, d.id DESC
+        LIMIT %s OFFSET %s
+    """, [f'{scope} AND title : ({match})', f'{scope} AND {{title body}} : ({match}) NOT title : ({match})',
+          *kind_params, limit, offset])
+    return [pk for pk, in page]
+
+
+def _search_postgresql(connection, doctor_id, words, kinds, offset, limit):
+    # search_vector is a generated, GIN-indexed column (migration 0010) with
+    # the title weighted above the body.
+    query = ' & '.join([*words[:-1], f'{words[-1]}:*'])
+    kind_sql, kind_params = _kind_filter('kind', kinds)
+    return [pk for pk, in _fetch(connection, f"""
+        SELECT id FROM reports_searchdocument
+        WHERE doctor_id = %s AND search_vector @@ to_tsquery('simple', %s){kind_sql}
+        ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, created_at DESC, id DESC
+        LIMIT %s OFFSET %s
+    """, [doctor_id, query, *kind_params, query, limit, offset])]
+
+
+def _search_fallback(connection, doctor_id, words, kinds, offset, limit):
+    # Unindexed substring match, for databases without a full-text engine.
+    documents = SearchDocument.objects.using(connection.alias).filter(doctor_id=doctor_id)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    for word in words:
+        documents = documents.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    return list(documents.order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + limit])
+
+
+def snippet(text, words):
+    # Up to SNIPPET_WORDS words of the text around the first matching word.
+    tokens = text.split()
+    start = next((
+        n for n, token in enumerate(tokens)
+        if any(word in token.lower() for word in words)
+    ), 0)
+    start = max(0, min(start - SNIPPET_WORDS // 4, len(tokens) - SNIPPET_WORDS))
+    window = ' '.join(tokens[start:start + SNIPPET_WORDS])
+    return ('…' if start else '') + window + ('…' if start + SNIPPET_WORDS < len(tokens) else '')
+
+
+def search(doctor_id, query, kinds=None, offset=0, limit=20):
+    # Ranked matches among the documents scoped to this doctor, each with a
+    # snippet and its patient loaded. Every word must match, the last as a
+    # prefix. Snippets are cut in Python from the page's own text: FTS5's
+    # snippet() re-runs a prefix query for every row it is asked about.
+    words = terms(query)
+    if not words:
+        return []
+    connection = connections[router.db_for_read(SearchDocument)]
+    if connection.vendor == 'sqlite' and _has_fts(connection):
+        matches = _search_sqlite(connection, doctor_id, words, kinds, offset, limit)
+    elif connection.vendor == 'postgresql':
+        matches = _search_postgresql(connection, doctor_id, words, kinds, offset, limit)
+    else:
+        matches = _search_fallback(connection, doctor_id, words, kinds, offset, limit)
+
+    documents = SearchDocument.objects.using(connection.alias).select_related('patient').only(
+        'kind', 'object_id', 'title', 'body', 'created_at',
+        'patient__username', 'patient__first_name', 'patient__last_name',
+    ).in_bulk(matches)
+    results = []
+    for pk in matches:
+        document = documents[pk]
+        document.snippet = snippet(document.body, words)
+        results.append(document)
+    return results
@@ -0,0 +1,126 @@
+import io
+import itertools
+import secrets
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from accounts.models import CustomUser, DoctorAssignmentLog, allocate_doctor_codes
+from .models import Report, PatientReport, PatientMessage
+from .stats import rebuild_counters
+from . import search
+
+# Seeded accounts cannot log in; benchmarks authenticate them directly.
+UNUSABLE_PASSWORD = '!seeded'
+RESULTS = ('ALL', 'AML', 'CLL', 'CML', 'Normal')
+PRIORITIES = ('low', 'normal', 'high', 'urgent')
+# Shared by every seeded row, under their own prefix in MEDIA_ROOT.
+SEED_IMAGE = 'seed/image.jpg'
+SEED_PDF = 'seed/report.pdf'
+
+# Presets for --scale; `full` is 10k doctors, 1M patients and 10M reports.
+SCALES = {
+    'small': {'doctors': 10, 'patients_per_doctor': 100},
+    'medium': {'doctors': 100, 'patients_per_doctor': 100},
+    'large': {'doctors': 1000, 'patients_per_doctor': 100},
+    'full': {'doctors': 10000, 'patients_per_doctor': 100},
+}
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert(model, rows, batch_size, keep_ids=False):
+    # Returns the new ids with keep_ids, otherwise only how many rows went in.
+    ids, count = [], 0
+    for chunk in _chunks(rows, batch_size):
+        created = model.objects.bulk_create(chunk)
+        count += len(created)
+        if keep_ids:
+            ids += [obj.pk for obj in created]
+    return ids if keep_ids else count
+
+
+def ensure_seed_files():
+    # Every seeded row points at these two files, so media endpoints serve
+    # real bytes during benchmarks.
+    if not default_storage.exists(SEED_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (200, 30, 30)).save(buffer, format='JPEG')
+        default_storage.save(SEED_IMAGE, ContentFile(buffer.getvalue()))
+    if not default_storage.exists(SEED_PDF):
+        default_storage.save(SEED_PDF, ContentFile(b'%PDF-1.4\n%seeded report\n%%EOF\n'))
+
+
+def seed(doctors=10, patients_per_doctor=100, reports_per_patient=10, uploads_per_patient=1,
+         messages_per_patient=2, batch_size=5000, log=None):
+    # Rows are generated lazily and inserted in batches. Only the doctor and
+    # patient ids are kept; patient i belongs to doctor i % doctors.
+    run = secrets.token_hex(3)
+    log = log or (lambda message: None)
+    ensure_seed_files()
+
+    codes = allocate_doctor_codes(doctors)
+    doctor_ids = _insert(CustomUser, (
+        CustomUser(username=f'seed-{run}-doctor-{i}', password=UNUSABLE_PASSWORD, user_type='doctor',
+                   verified=True, doctor_code=codes[i], specialization='Hematology')
+        for i in range(doctors)
+    ), batch_size, keep_ids=True)
+    log(f'{len(doctor_ids)} doctors')
+
+    patient_ids = _insert(CustomUser, (
+        CustomUser(username=f'seed-{run}-patient-{i}', password=UNUSABLE_PASSWORD, user_type='user',
+                   assigned_doctor_id=doctor_ids[i % len(doctor_ids)])
+        for i in range(doctors * patients_per_doctor)
+    ), batch_size, keep_ids=True)
+    log(f'{len(patient_ids)} patients')
+
+    def patients():
+        for i, patient_id in enumerate(patient_ids):
+            yield patient_id, doctor_ids[i % len(doctor_ids)]
+
+    assignments = _insert(DoctorAssignmentLog, (
+        DoctorAssignmentLog(patient_id=patient_id, doctor_id=doctor_id, source='seed')
+        for patient_id, doctor_id in patients()
+    ), batch_size)
+    log(f'{assignments} assignment logs')
+
+    reports = _insert(Report, (
+        Report(user_id=patient_id, doctor_id=doctor_id if n % 2 else None,
+               image=SEED_IMAGE, result=RESULTS[n % len(RESULTS)], verified=bool(n % 2),
+               sent_to_patient=n % 4 == 1, comments='Seeded report')
+        for patient_id, doctor_id in patients() for n in range(reports_per_patient)
+    ), batch_size)
+    log(f'{reports} reports')
+
+    uploads = _insert(PatientReport, (
+        PatientReport(patient_id=patient_id, doctor_id=doctor_id, report_file=SEED_PDF, verified=bool(n % 2))
+        for patient_id, doctor_id in patients() for n in range(uploads_per_patient)
+    ), batch_size)
+    log(f'{uploads} patient reports')
+
+    messages = _insert(PatientMessage, (
+        PatientMessage(patient_id=patient_id, doctor_id=doctor_id, subject=f'Question {n}',
+                       message='Seeded message about my results.', priority=PRIORITIES[n % len(PRIORITIES)],
+                       is_read=bool(n % 2))
+        for patient_id, doctor_id in patients() for n in range(messages_per_patient)
+    ), batch_size)
+    log(f'{messages} messages')
+
+    if settings.REPORT_STATS_MATERIALIZED:
+        # bulk_create skips the signals that keep the counters current.
+        rebuild_counters(doctor_ids)
+        log(f'{len(doctor_ids)} doctor counters')
+
+    # The search documents are signal-maintained as well.
+    search.rebuild(batch_size=batch_size, log=log)
+
+    return {'doctors': doctor_ids, 'patients': patient_ids}
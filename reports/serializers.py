@@ -1,16 +1,48 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Report, PatientReport, PatientMessage
+from .models import Report, PatientReport, PatientMessage, PredictionJob, SearchDocument
+from accounts.authentication import get_full_user
 from accounts.models import CustomUser
 
+def protected_url(context, name, *args):
+    # Media is served through access-checked API endpoints, not MEDIA_URL.
+    url = reverse(name, args=args)
+    request = context.get('request')
+    return request.build_absolute_uri(url) if request else url
+
 class ReportSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.username', read_only=True)
     doctor_name = serializers.CharField(source='doctor.username', read_only=True)
+    image_url = serializers.SerializerMethodField()
+    gradcam_url = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Report
-        fields = ('id', 'user', 'user_name', 'doctor', 'doctor_name', 'image', 'result', 'gradcam_image', 'verified', 'sent_to_patient', 'sent_at', 'created_at', 'comments')
+        fields = ('id', 'user', 'user_name', 'doctor', 'doctor_name', 'image', 'image_url', 'result', 'gradcam_image', 'gradcam_url', 'thumbnails', 'verified', 'sent_to_patient', 'sent_at', 'created_at', 'comments')
         read_only_fields = ('user', 'doctor', 'created_at')
 
+    def get_image_url(self, obj):
+        return protected_url(self.context, 'report-image', obj.id)
+
+    def get_gradcam_url(self, obj):
+        return protected_url(self.context, 'report-gradcam', obj.id) if obj.gradcam_image else None
+
+    def get_thumbnails(self, obj):
+        kinds = ['image', 'gradcam'] if obj.gradcam_image else ['image']
+        return {
+            kind: {size: protected_url(self.context, 'report-thumbnail', obj.id, kind, size) for size in settings.THUMBNAIL_SIZES}
+            for kind in kinds
+        }
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user', 'doctor').only(
+            'id', 'user', 'user__username', 'doctor', 'doctor__username', 'image', 'result', 'gradcam_image',
+            'verified', 'sent_to_patient', 'sent_at', 'created_at', 'comments'
+        )
+
 class PatientReportUploadSerializer(serializers.ModelSerializer):
     doctor_code = serializers.CharField(write_only=True)
 
@@ -39,6 +71,13 @@ class PatientMessageSerializer(serializers.ModelSerializer):
         fields = ['id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'subject', 'message', 'priority', 'created_at', 'is_read']
         read_only_fields = ('patient', 'doctor', 'created_at')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('patient', 'doctor').only(
+            'id', 'patient', 'patient__username', 'doctor', 'doctor__username', 'subject', 'message', 'priority',
+            'created_at', 'is_read'
+        )
+
 class PatientMessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PatientMessage
@@ -46,17 +85,100 @@ class PatientMessageCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         patient = self.context['request'].user
-        doctor = patient.assigned_doctor
-        if not doctor:
+        # Read the current assignment; token claims may predate a relink.
+        doctor_id = get_full_user(patient).assigned_doctor_id
+        if not doctor_id:
             raise serializers.ValidationError('You must be linked to a doctor to send messages.')
         validated_data['patient'] = patient
-        validated_data['doctor'] = doctor
+        validated_data['doctor_id'] = doctor_id
         return PatientMessage.objects.create(**validated_data)
 
 class PatientReportListSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.username', read_only=True)
     doctor_name = serializers.CharField(source='doctor.username', read_only=True)
+    file_url = serializers.SerializerMethodField()
 
     class Meta:
         model = PatientReport
-        fields = ['id', 'patient_name', 'doctor_name', 'report_file', 'uploaded_at', 'verified', 'comments']
+        fields = ['id', 'patient_name', 'doctor_name', 'report_file', 'file_url', 'uploaded_at', 'verified', 'comments']
+
+    def get_file_url(self, obj):
+        return protected_url(self.context, 'patient-report-file', obj.id)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('patient', 'doctor').only(
+            'id', 'patient', 'patient__username', 'doctor', 'doctor__username', 'report_file', 'uploaded_at',
+            'verified', 'comments'
+        )
+
+class PredictionJobSerializer(serializers.ModelSerializer):
+    result = serializers.CharField(source='report.result', read_only=True)
+
+    class Meta:
+        model = PredictionJob
+        fields = ['id', 'report', 'status', 'attempts', 'error', 'result', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+class SearchResultSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='object_id', read_only=True)
+    patient_name = serializers.SerializerMethodField()
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = SearchDocument
+        fields = ['kind', 'id', 'patient', 'patient_name', 'title', 'snippet', 'created_at']
+        read_only_fields = fields
+
+    def get_patient_name(self, obj):
+        return f"{obj.patient.first_name} {obj.patient.last_name}".strip() or obj.patient.username
+
+class ReportFilterSerializer(serializers.Serializer):
+    # Sources are ORM lookups, so validated_data can be passed to filter().
+    patient = serializers.IntegerField(source='user_id', required=False)
+    verified = serializers.BooleanField(required=False)
+    sent_to_patient = serializers.BooleanField(required=False)
+    result = serializers.CharField(required=False)
+    created_after = serializers.DateTimeField(source='created_at__gte', required=False)
+    created_before = serializers.DateTimeField(source='created_at__lt', required=False)
+
+class PatientReportFilterSerializer(serializers.Serializer):
+    patient = serializers.IntegerField(source='patient_id', required=False)
+    verified = serializers.BooleanField(required=False)
+    uploaded_after = serializers.DateTimeField(source='uploaded_at__gte', required=False)
+    uploaded_before = serializers.DateTimeField(source='uploaded_at__lt', required=False)
+
+class BulkUpdateSerializer(serializers.Serializer):
+    # Either explicit ids or a filter, not both.
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    comments = serializers.CharField(required=False, allow_blank=True)
+    send = serializers.BooleanField(required=False, default=False)
+
+    def __init__(self, *args, filter_serializer=ReportFilterSerializer, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['filter'] = filter_serializer(required=False)
+
+    def validate_ids(self, ids):
+        if len(ids) > settings.BULK_UPDATE_MAX_ROWS:
+            raise serializers.ValidationError(f'At most {settings.BULK_UPDATE_MAX_ROWS} ids per request.')
+        return ids
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either ids or filter.')
+        return attrs
+
+class MarkMessagesReadSerializer(serializers.Serializer):
+    # Either explicit ids or a watermark: every message up to this id.
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    up_to = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_ids(self, ids):
+        if len(ids) > settings.BULK_UPDATE_MAX_ROWS:
+            raise serializers.ValidationError(f'At most {settings.BULK_UPDATE_MAX_ROWS} ids per request.')
+        return ids
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('up_to' in attrs):
+            raise serializers.ValidationError('Provide either ids or up_to.')
+        return attrs
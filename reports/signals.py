@@ -0,0 +1,33 @@
+from django.dispatch import Signal
+
+# Sent after set-based writes (bulk_create, queryset.update) that bypass the
+# per-instance model signals. Receivers get the model class as sender, the
+# primary keys of the rows actually changed as `ids` and, for updates, the
+# names of the changed fields as `fields` (None: any field, e.g. new rows).
+bulk_changed = Signal()
+
+# Helpers for the receivers in reports.receivers. They compare against the
+# values LoadedValuesMixin kept for the models' tracked_fields.
+
+UNKNOWN = object()
+
+
+def touches(fields, *names):
+    return fields is None or not set(fields).isdisjoint(names)
+
+
+def previous(instance, field):
+    return getattr(instance, '_loaded', {}).get(field, UNKNOWN)
+
+
+def became_true(instance, field, created):
+    value = getattr(instance, field)
+    return bool(value) and (created or previous(instance, field) is False)
+
+
+def changed(instance, created, *fields):
+    # Fields left deferred were not loaded, so they cannot have been changed.
+    if created:
+        return True
+    deferred = instance.get_deferred_fields()
+    return any(field not in deferred and previous(instance, field) != getattr(instance, field) for field in fields)
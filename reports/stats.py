@@ -0,0 +1,72 @@
+from django.db.models import Count, F, IntegerField, Q, Value
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .models import Report, PatientReport, DoctorReportCounters
+
+COUNTER_FIELDS = ('pending_microscopic', 'verified_microscopic', 'pending_uploaded', 'verified_uploaded')
+
+
+def _counts(queryset, doctor, kind):
+    # Per doctor, conditional counts of the pending and verified rows; the
+    # other table's columns are zero so both sides line up for the UNION.
+    zero = Value(0, output_field=IntegerField())
+    counts = {field: zero for field in COUNTER_FIELDS}
+    counts[f'pending_{kind}'] = Count('pk', filter=Q(verified=False))
+    counts[f'verified_{kind}'] = Count('pk', filter=Q(verified=True))
+    return queryset.order_by().values(doctor_pk=F(doctor)).annotate(**counts)
+
+
+def stats_query(doctor_ids=None):
+    # One statement: a GROUP BY per table joined by UNION ALL. Grouping both
+    # tables through a join on the doctor instead would pair every
+    # microscopic report with every uploaded one.
+    microscopic, uploaded = Report.objects.all(), PatientReport.objects.all()
+    if doctor_ids is not None:
+        microscopic = microscopic.filter(user__assigned_doctor__in=doctor_ids)
+        uploaded = uploaded.filter(doctor__in=doctor_ids)
+    return _counts(microscopic, 'user__assigned_doctor', 'microscopic').union(
+        _counts(uploaded, 'doctor', 'uploaded'), all=True
+    )
+
+
+def report_stats(doctor_ids, query=None):
+    # {doctor_id: counts} for every id, zeros included.
+    stats = {doctor_id: dict.fromkeys(COUNTER_FIELDS, 0) for doctor_id in doctor_ids}
+    for row in (stats_query(doctor_ids) if query is None else query):
+        counts = stats.get(row.pop('doctor_pk'))
+        if counts is not None:
+            for field, value in row.items():
+                counts[field] += value
+    return stats
+
+
+def compute_report_stats(doctor_id):
+    return report_stats([doctor_id])[doctor_id]
+
+
+def rebuild_counters(doctor_ids=None):
+    doctors = CustomUser.objects.filter(user_type='doctor')
+    if doctor_ids is None:
+        # Every doctor: one pass over both tables, no id list in the query.
+        stats = report_stats(list(doctors.values_list('pk', flat=True)), query=stats_query())
+    else:
+        doctors = doctors.filter(pk__in=[doctor_id for doctor_id in doctor_ids if doctor_id])
+        stats = report_stats(list(doctors.values_list('pk', flat=True)))
+    # An upsert, so two rebuilds of the same doctor cannot both insert.
+    return DoctorReportCounters.objects.bulk_create(
+        [DoctorReportCounters(doctor_id=doctor_id, **counts) for doctor_id, counts in stats.items()],
+        update_conflicts=True, unique_fields=['doctor'], update_fields=[*COUNTER_FIELDS, 'updated_at'],
+    )
+
+
+def apply_delta(doctor_id, **deltas):
+    if not doctor_id:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    updated = DoctorReportCounters.objects.filter(pk=doctor_id).update(updated_at=timezone.now(), **changes)
+    if not updated:
+        # No row yet: build it from scratch, which already includes this change.
+        rebuild_counters([doctor_id])
@@ -0,0 +1,68 @@
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .seeding import RESULTS
+
+
+class StubPredictorHandler(BaseHTTPRequestHandler):
+    # Answers /predict and /predict/batch like the real service, after a
+    # configurable delay. For load tests only; it never looks at the image.
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    batch = True
+    verbose = False
+
+    def read_body(self):
+        # PredictionClient streams uploads with chunked transfer encoding.
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if not size:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def prediction(self):
+        return {'class': random.choice(RESULTS), 'confidence': round(random.uniform(0.5, 1), 3)}
+
+    def do_POST(self):
+        body = self.read_body()
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        path = self.path.split('?')[0].rstrip('/')
+        if random.random() < self.error_rate:
+            self.respond(503, {'detail': 'Injected failure.'})
+        elif path == '/predict':
+            self.respond(200, self.prediction())
+        elif path == '/predict/batch' and self.batch:
+            self.respond(200, {'results': [self.prediction() for _ in range(body.count(b'form-data; name="files"'))]})
+        else:
+            self.respond(404, {'detail': 'Not found.'})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8000, latency=0.0, jitter=0.0, error_rate=0.0, batch=True, verbose=False):
+    handler = type('ConfiguredStubPredictorHandler', (StubPredictorHandler,), {
+        'latency': latency, 'jitter': jitter, 'error_rate': error_rate, 'batch': batch, 'verbose': verbose,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
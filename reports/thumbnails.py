@@ -0,0 +1,68 @@
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Report
+from .prediction_cache import hash_file
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+def thumbnail_name(source_sha256, size):
+    # Content-addressed: identical source images share their derivatives, and
+    # changing a size's pixels or the quality renders new ones.
+    fmt = settings.THUMBNAIL_FORMAT
+    pixels = settings.THUMBNAIL_SIZES[size]
+    return (f'thumbnails/{source_sha256[:2]}/'
+            f'{source_sha256}-{size}-{pixels}q{settings.THUMBNAIL_QUALITY}.{EXTENSIONS[fmt]}')
+
+
+def render_thumbnail(source, pixels):
+    image = ImageOps.exif_transpose(Image.open(source))
+    image.thumbnail((pixels, pixels), Image.LANCZOS)
+    if settings.THUMBNAIL_FORMAT == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, format=settings.THUMBNAIL_FORMAT, quality=settings.THUMBNAIL_QUALITY)
+    return output.getvalue()
+
+
+def get_thumbnail(field_file, size, source_sha256=None):
+    pixels = settings.THUMBNAIL_SIZES[size]
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        name = thumbnail_name(source_sha256 or hash_file(source), size)
+        if not storage.exists(name):
+            content = render_thumbnail(source, pixels)
+            if not storage.exists(name):
+                storage.save(name, ContentFile(content))
+    return name
+
+
+def report_sources(report):
+    # kind -> (file, field holding its sha256)
+    sources = {'image': (report.image, 'image_sha256')}
+    if report.gradcam_image:
+        sources['gradcam'] = (report.gradcam_image, 'gradcam_sha256')
+    return sources
+
+
+def source_hash(report, field_file, hash_field):
+    # Hashes a source once (e.g. Grad-CAM images, reports from before
+    # image_sha256) and stores the digest on the report.
+    digest = getattr(report, hash_field)
+    if not digest:
+        with field_file.open('rb') as source:
+            digest = hash_file(source)
+        Report.objects.filter(pk=report.pk).update(**{hash_field: digest})
+        setattr(report, hash_field, digest)
+    return digest
+
+
+def generate_report_thumbnails(report):
+    for field_file, hash_field in report_sources(report).values():
+        source_sha256 = source_hash(report, field_file, hash_field)
+        for size in settings.THUMBNAIL_SIZES:
+            get_thumbnail(field_file, size, source_sha256)
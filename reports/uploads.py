@@ -0,0 +1,87 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+SIGNATURES = {
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'tiff': (b'II*\x00', b'MM\x00*'),
+    'bmp': (b'BM',),
+    'pdf': (b'%PDF-',),
+}
+IMAGE_TYPES = ('jpeg', 'png', 'tiff', 'bmp')
+PDF_TYPES = ('pdf',)
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class UnsupportedUploadType(APIException):
+    status_code = status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+    default_detail = 'Uploaded file type is not supported.'
+    default_code = 'unsupported_upload_type'
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    # Spools every chunk straight to a temporary file (never to memory) and
+    # checks size, file signature and SHA-256 while the chunks arrive. The
+    # resulting file carries a `sha256` attribute, and storage moves the temp
+    # file into place instead of copying it.
+
+    def __init__(self, request=None, max_size=None, allowed_types=()):
+        super().__init__(request)
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        if self.max_size and content_length and content_length > self.max_size:
+            raise UploadTooLarge()
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.max_size and self.size > self.max_size:
+            raise UploadTooLarge()
+        if self.allowed_types and len(self.head) < 8:
+            self.head += raw_data[:8 - len(self.head)]
+            if len(self.head) >= 8:
+                self.check_type()
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_type(self):
+        for file_type in self.allowed_types:
+            if self.head.startswith(SIGNATURES[file_type]):
+                return
+        raise UnsupportedUploadType()
+
+    def file_complete(self, file_size):
+        if self.allowed_types and len(self.head) < 8:
+            self.check_type()
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class StreamingUploadMixin:
+    upload_max_size_setting = None
+    upload_types = ()
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [
+            StreamingUploadHandler(
+                request,
+                max_size=getattr(settings, self.upload_max_size_setting),
+                allowed_types=self.upload_types,
+            )
+        ]
+        return super().initialize_request(request, *args, **kwargs)
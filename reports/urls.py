@@ -1,20 +1,36 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('reports/', views.ReportListView.as_view(), name='reports'),
+    path('reports/<int:pk>/image/', views.ReportMediaView.as_view(), name='report-image'),
+    path('reports/<int:pk>/gradcam/', views.ReportGradcamMediaView.as_view(), name='report-gradcam'),
+    path('patient-reports/<int:pk>/file/', views.PatientReportFileView.as_view(), name='patient-report-file'),
+    path('reports/<int:pk>/thumbnail/<str:kind>/<str:size>/', views.ReportThumbnailView.as_view(), name='report-thumbnail'),
     path('upload/', views.ReportUploadView.as_view(), name='upload'),
+    path('prediction-jobs/<int:pk>/', views.PredictionJobStatusView.as_view(), name='prediction-job'),
+    path('prediction-service/status/', views.PredictionServiceStatusView.as_view(), name='prediction-service-status'),
     path('verify-report/<int:pk>/', views.ReportVerifyView.as_view(), name='verify-report'),
     path('send-report-to-patient/<int:pk>/', views.SendReportToPatientView.as_view(), name='send-report-to-patient'),
+    path('verify-reports/', views.BulkReportVerifyView.as_view(), name='bulk-verify-reports'),
+    path('send-reports-to-patient/', views.BulkSendReportsView.as_view(), name='bulk-send-reports'),
     path('contact-doctor/', views.ContactDoctorView.as_view(), name='contact-doctor'),
     path('upload-patient-report/', views.UploadPatientReportView.as_view(), name='upload-patient-report'),
     path('doctor-reports/', views.DoctorPatientReportsView.as_view(), name='doctor-reports'),
     path('patient-reports/', views.PatientReportsView.as_view(), name='patient-reports'),
     path('verify-patient-report/<int:pk>/', views.VerifyPatientReportView.as_view(), name='verify-patient-report'),
+    path('verify-patient-reports/', views.BulkPatientReportVerifyView.as_view(), name='bulk-verify-patient-reports'),
     path('patient-messages/', views.PatientMessageListView.as_view(), name='patient-messages'),
     path('send-message/', views.PatientMessageCreateView.as_view(), name='send-message'),
     path('mark-message-read/<int:pk>/', views.PatientMessageMarkReadView.as_view(), name='mark-message-read'),
+    path('mark-messages-read/', views.MarkMessagesReadView.as_view(), name='bulk-mark-messages-read'),
+    path('unread-messages/', views.UnreadMessageCountView.as_view(), name='unread-message-counts'),
     path('create-report-from-analysis/', views.CreateReportFromAnalysisView.as_view(), name='create-report-from-analysis'),
     path('patient-microscopic-reports/', views.PatientMicroscopicReportsView.as_view(), name='patient-microscopic-reports'),
+    path('events/', async_views.event_stream, name='events'),
+    path('async/upload/', async_views.upload_report, name='async-upload'),
+    path('async/contact-doctor/', async_views.contact_doctor, name='async-contact-doctor'),
+    path('export/<slug:kind>.<slug:fmt>', views.ExportView.as_view(), name='export'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('doctor-report-stats/', views.DoctorReportStatsView.as_view(), name='doctor-report-stats'),
 ]
@@ -1,15 +1,41 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Report, PatientReport, PatientMessage
-from .serializers import ReportSerializer, PatientReportUploadSerializer, PatientReportListSerializer, PatientMessageSerializer, PatientMessageCreateSerializer
+from django.urls import reverse
+from django.utils import timezone
+from .models import Report, PatientReport, PatientMessage, PredictionJob, DoctorReportCounters, SearchDocument
+from .serializers import ReportSerializer, PatientReportUploadSerializer, PatientReportListSerializer, PatientMessageSerializer, PatientMessageCreateSerializer, PredictionJobSerializer, SearchResultSerializer, BulkUpdateSerializer, ReportFilterSerializer, PatientReportFilterSerializer, MarkMessagesReadSerializer
+from .jobs import enqueue_prediction
+from .prediction import get_client, predict_image, PredictionError
+from . import events, exporting, prediction_cache, search
+from .bulk import ReportVerification, ReportSending, PatientReportVerification, MessagesRead
+from .signals import bulk_changed
+from .stats import COUNTER_FIELDS, compute_report_stats, rebuild_counters
+from .media import ProtectedMediaView, serve_file
+from .uploads import IMAGE_TYPES, PDF_TYPES, StreamingUploadMixin
+from .thumbnails import generate_report_thumbnails, get_thumbnail, report_sources, source_hash
 from accounts.models import CustomUser
-import requests
+from leukemia_detection.caching import PerUserCacheMixin
+from leukemia_detection.database import ReplicaReadMixin
+from leukemia_detection.mixins import EagerLoadingMixin
+from leukemia_detection.pagination import UploadedAtCursorPagination
 import os
 
-class ReportListView(generics.ListAPIView):
+class PredictionServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Prediction service is unavailable, please try again later.'
+    default_code = 'prediction_unavailable'
+
+class ReportListView(ReplicaReadMixin, EagerLoadingMixin, generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = ReportSerializer
 
@@ -20,25 +46,119 @@ class ReportListView(generics.ListAPIView):
         else:
             return Report.objects.filter(user=user)
 
-class ReportUploadView(generics.CreateAPIView):
+class ReportUploadView(StreamingUploadMixin, generics.CreateAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = ReportSerializer
     parser_classes = (MultiPartParser, FormParser)
+    upload_max_size_setting = 'REPORT_IMAGE_MAX_UPLOAD_SIZE'
+    upload_types = IMAGE_TYPES
+
+    def is_async(self):
+        mode = self.request.query_params.get('async')
+        if mode is None:
+            return settings.PREDICTION_ASYNC_UPLOADS
+        return mode.lower() in ('1', 'true', 'yes')
+
+    def create(self, request, *args, **kwargs):
+        if not self.is_async():
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        digest = prediction_cache.hash_file(request.FILES['image'])
+        cached = prediction_cache.lookup(digest)
+        if cached:
+            report = self.save_cached(serializer, cached, digest)
+            job = PredictionJob.objects.create(report=report, status='done', finished_at=timezone.now())
+        else:
+            report = serializer.save(user=request.user, image_sha256=digest, result='', gradcam_image=None)
+            job = enqueue_prediction(report)
+        return Response({
+            "job_id": job.id,
+            "report_id": report.id,
+            "status": job.status,
+            "status_url": reverse('prediction-job', args=[job.id]),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def save_cached(self, serializer, cached, digest):
+        return save_cached_report(serializer, self.request.user, digest, cached)
 
     def perform_create(self, serializer):
-        # Call FastAPI prediction
         image = self.request.FILES['image']
-        files = {'file': image}
-        response = requests.post('http://localhost:8000/predict', files=files)
-        if response.status_code == 200:
-            result = response.json()
-            serializer.save(
-                user=self.request.user,
-                result=result['class'],
-                gradcam_image=None  # For now, no gradcam
-            )
-        else:
-            raise Exception("Prediction failed")
+        digest = prediction_cache.hash_file(image)
+        cached = prediction_cache.lookup(digest)
+        if cached:
+            self.save_cached(serializer, cached, digest)
+            return
+        try:
+            result = predict_image(image)
+        except PredictionError:
+            raise PredictionServiceUnavailable()
+        save_predicted_report(serializer, self.request.user, digest, result['class'])
+
+# Shared by ReportUploadView and the async upload view (reports.async_views).
+def save_cached_report(serializer, user, digest, cached):
+    # Reuse the stored copy of an identical image instead of writing another one.
+    return serializer.save(user=user, image=cached.image.name, image_sha256=digest, result=cached.result, gradcam_image=None)
+
+def save_predicted_report(serializer, user, digest, result):
+    report = serializer.save(user=user, image_sha256=digest, result=result, gradcam_image=None)  # For now, no gradcam
+    prediction_cache.store(digest, report.result, report.image.name)
+    if settings.THUMBNAIL_EAGER:
+        generate_report_thumbnails(report)
+    return report
+
+def report_access(user, prefix=''):
+    # Patients see their own reports; doctors see their patients' reports and
+    # the ones they verified.
+    if user.user_type == 'doctor':
+        return Q(**{f'{prefix}user__assigned_doctor': user}) | Q(**{f'{prefix}doctor': user})
+    return Q(**{f'{prefix}user': user})
+
+class PredictionJobStatusView(generics.RetrieveAPIView):
+    permission_classes = (IsAuthenticated,)
+    serializer_class = PredictionJobSerializer
+
+    def get_queryset(self):
+        return PredictionJob.objects.select_related('report').filter(report_access(self.request.user, 'report__'))
+
+class ReportMediaView(ProtectedMediaView):
+    file_field = 'image'
+
+    def get_queryset(self):
+        return Report.objects.filter(report_access(self.request.user))
+
+class ReportGradcamMediaView(ReportMediaView):
+    file_field = 'gradcam_image'
+
+class PatientReportFileView(ProtectedMediaView):
+    file_field = 'report_file'
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'doctor':
+            return PatientReport.objects.filter(doctor=user)
+        return PatientReport.objects.filter(patient=user)
+
+class ReportThumbnailView(ReportMediaView):
+    # The URL names the report, not the source content, so clients
+    # revalidate; a replaced source gets a new derivative and ETag.
+    def get(self, request, pk, kind, size):
+        report = self.get_object()
+        sources = report_sources(report)
+        if kind not in sources or size not in settings.THUMBNAIL_SIZES:
+            raise Http404
+        field_file, hash_field = sources[kind]
+        name = get_thumbnail(field_file, size, source_hash(report, field_file, hash_field))
+        return serve_file(request, field_file.storage, name, self.cache_control)
+
+class PredictionServiceStatusView(generics.GenericAPIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        data = get_client().status()
+        data['cache'] = prediction_cache.stats()
+        return Response(data)
 
 class ReportVerifyView(generics.UpdateAPIView):
     permission_classes = (IsAuthenticated,)
@@ -61,6 +181,56 @@ class SendReportToPatientView(generics.UpdateAPIView):
             raise PermissionError("Only doctors can send reports to patients")
         serializer.save(sent_to_patient=True, sent_at=timezone.now())
 
+class BulkUpdateView(generics.GenericAPIView):
+    # POST {"ids": [...]} or {"filter": {...}} applies one change to many
+    # rows in a transaction. Rows outside get_queryset() are reported as
+    # forbidden rather than changed.
+    permission_classes = (IsAuthenticated,)
+    filter_serializer_class = ReportFilterSerializer
+    forbidden_message = None
+
+    def get_serializer(self, *args, **kwargs):
+        return BulkUpdateSerializer(*args, filter_serializer=self.filter_serializer_class, **kwargs)
+
+    def get_update(self, data):
+        raise NotImplementedError
+
+    def post(self, request):
+        if request.user.user_type != 'doctor':
+            return Response({"error": self.forbidden_message}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = self.get_update(data).run(
+            self.get_queryset(), ids=data.get('ids'), filters=data.get('filter'), limit=settings.BULK_UPDATE_MAX_ROWS
+        )
+        return Response(result)
+
+class BulkReportVerifyView(BulkUpdateView):
+    forbidden_message = "Only doctors can verify reports"
+
+    def get_queryset(self):
+        return Report.objects.filter(report_access(self.request.user))
+
+    def get_update(self, data):
+        return ReportVerification(self.request.user, data.get('comments'), data['send'])
+
+class BulkSendReportsView(BulkReportVerifyView):
+    forbidden_message = "Only doctors can send reports to patients"
+
+    def get_update(self, data):
+        return ReportSending()
+
+class BulkPatientReportVerifyView(BulkUpdateView):
+    filter_serializer_class = PatientReportFilterSerializer
+    forbidden_message = "Only doctors can verify reports"
+
+    def get_queryset(self):
+        return PatientReport.objects.filter(doctor=self.request.user)
+
+    def get_update(self, data):
+        return PatientReportVerification(data.get('comments'))
+
 class ContactDoctorView(generics.CreateAPIView):
     permission_classes = (IsAuthenticated,)
 
@@ -70,14 +240,17 @@ class ContactDoctorView(generics.CreateAPIView):
         # For now, just return success
         return Response({"message": "Message sent successfully"}, status=status.HTTP_200_OK)
 
-class UploadPatientReportView(generics.CreateAPIView):
+class UploadPatientReportView(StreamingUploadMixin, generics.CreateAPIView):
     serializer_class = PatientReportUploadSerializer
     permission_classes = [IsAuthenticated]
+    upload_max_size_setting = 'PATIENT_REPORT_MAX_UPLOAD_SIZE'
+    upload_types = PDF_TYPES
 
 
-class DoctorPatientReportsView(generics.ListAPIView):
+class DoctorPatientReportsView(ReplicaReadMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = PatientReportListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UploadedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -85,9 +258,10 @@ class DoctorPatientReportsView(generics.ListAPIView):
             return PatientReport.objects.filter(doctor=user)
         return PatientReport.objects.none()
 
-class PatientReportsView(generics.ListAPIView):
+class PatientReportsView(ReplicaReadMixin, PerUserCacheMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = PatientReportListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = UploadedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -105,7 +279,7 @@ class VerifyPatientReportView(generics.UpdateAPIView):
             raise PermissionError("Only doctors can verify reports")
         serializer.save(verified=True, comments=self.request.data.get('comments', ''))
 
-class PatientMessageListView(generics.ListAPIView):
+class PatientMessageListView(ReplicaReadMixin, PerUserCacheMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = PatientMessageSerializer
     permission_classes = [IsAuthenticated]
 
@@ -131,9 +305,45 @@ class PatientMessageMarkReadView(generics.UpdateAPIView):
             raise PermissionError("Only doctors can mark messages as read")
         serializer.save(is_read=True)
 
-class CreateReportFromAnalysisView(generics.CreateAPIView):
+class MarkMessagesReadView(generics.GenericAPIView):
+    # POST {"ids": [...]} or {"up_to": id} marks the doctor's messages read
+    # in one UPDATE and returns the remaining unread counts. Only the ids
+    # form reports per-message results.
+    permission_classes = (IsAuthenticated,)
+    serializer_class = MarkMessagesReadSerializer
+
+    def post(self, request):
+        if request.user.user_type != 'doctor':
+            return Response({"error": "Only doctors can mark messages as read"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids, up_to = serializer.validated_data.get('ids'), serializer.validated_data.get('up_to')
+        messages = PatientMessage.objects.filter(doctor=request.user)
+        if ids:
+            result = MessagesRead(request.user).run(messages, ids=ids)
+        else:
+            result = MessagesRead(request.user, up_to).mark_up_to(messages)
+        result['unread'] = events.unread_counts(request.user.pk)
+        return Response(result)
+
+class UnreadMessageCountView(ReplicaReadMixin, PerUserCacheMixin, generics.GenericAPIView):
+    # Inbox badges: the doctor's unread messages by priority, answered with
+    # 304 until a message arrives or is read.
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        if request.user.user_type != 'doctor':
+            return Response({"error": "Only doctors can access this endpoint"}, status=status.HTTP_403_FORBIDDEN)
+        return self.list(request)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: Response(events.unread_counts(request.user.pk)))
+
+class CreateReportFromAnalysisView(StreamingUploadMixin, generics.CreateAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = ReportSerializer
+    upload_max_size_setting = 'REPORT_IMAGE_MAX_UPLOAD_SIZE'
+    upload_types = IMAGE_TYPES
 
     def create(self, request, *args, **kwargs):
         patients = request.POST.getlist('patients')
@@ -147,25 +357,49 @@ class CreateReportFromAnalysisView(generics.CreateAPIView):
         if request.user.user_type != 'doctor':
             return Response({"error": "Only doctors can create reports from analysis"}, status=status.HTTP_403_FORBIDDEN)
 
-        created_reports = []
+        patient_ids = []
+        skipped_patients = []
         for patient_id in patients:
-            try:
-                patient = CustomUser.objects.get(id=patient_id, user_type='user')
-                report = Report.objects.create(
-                    user=patient,
-                    image=image,
-                    result=result,
-                    verified=True,  # Since it's from doctor's analysis
-                    doctor=request.user,
-                    comments=f"Analysis confidence: {confidence}"
-                )
-                created_reports.append(report.id)
-            except CustomUser.DoesNotExist:
-                continue
-
-        return Response({"created_reports": created_reports}, status=status.HTTP_201_CREATED)
-
-class PatientMicroscopicReportsView(generics.ListAPIView):
+            if patient_id.isdigit() and int(patient_id) not in patient_ids:
+                patient_ids.append(int(patient_id))
+            else:
+                skipped_patients.append(patient_id)
+        found = set(CustomUser.objects.filter(id__in=patient_ids, user_type='user').values_list('id', flat=True))
+        skipped_patients += [str(patient_id) for patient_id in patient_ids if patient_id not in found]
+        patient_ids = [patient_id for patient_id in patient_ids if patient_id in found]
+        if not patient_ids:
+            return Response({"created_reports": [], "skipped_patients": skipped_patients}, status=status.HTTP_201_CREATED)
+
+        # Store the image once and point every report at the same file.
+        image_field = Report._meta.get_field('image')
+        digest = prediction_cache.hash_file(image)
+        image_name = image_field.storage.save(image_field.generate_filename(None, image.name), image, max_length=image_field.max_length)
+        try:
+            with transaction.atomic():
+                reports = Report.objects.bulk_create([
+                    Report(
+                        user_id=patient_id,
+                        image=image_name,
+                        image_sha256=digest,
+                        result=result,
+                        verified=True,  # Since it's from doctor's analysis
+                        doctor=request.user,
+                        comments=f"Analysis confidence: {confidence}"
+                    )
+                    for patient_id in patient_ids
+                ])
+                events.record_many((report.user_id, 'report_verified', {'id': report.id}) for report in reports)
+        except Exception:
+            image_field.storage.delete(image_name)
+            raise
+        bulk_changed.send(sender=Report, ids=[report.id for report in reports])
+
+        return Response({
+            "created_reports": [report.id for report in reports],
+            "skipped_patients": skipped_patients
+        }, status=status.HTTP_201_CREATED)
+
+class PatientMicroscopicReportsView(ReplicaReadMixin, PerUserCacheMixin, EagerLoadingMixin, generics.ListAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = ReportSerializer
 
@@ -182,24 +416,87 @@ class DoctorReportStatsView(generics.RetrieveAPIView):
         if request.user.user_type != 'doctor':
             return Response({"error": "Only doctors can access this endpoint"}, status=status.HTTP_403_FORBIDDEN)
 
-        # Get all reports for patients assigned to this doctor
-        doctor_patients = CustomUser.objects.filter(assigned_doctor=request.user)
+        if settings.REPORT_STATS_MATERIALIZED:
+            counters = DoctorReportCounters.objects.filter(pk=request.user.pk).first()
+            if counters is None:
+                counters = rebuild_counters([request.user.pk])[0]
+            counts = {field: getattr(counters, field) for field in COUNTER_FIELDS}
+        else:
+            counts = compute_report_stats(request.user.pk)
 
-        # Count microscopic analysis reports (Report model)
-        microscopic_reports = Report.objects.filter(user__in=doctor_patients)
-        pending_microscopic = microscopic_reports.filter(verified=False).count()
-        verified_microscopic = microscopic_reports.filter(verified=True).count()
+        return Response({
+            "pending_reports": counts['pending_microscopic'] + counts['pending_uploaded'],
+            "verified_reports": counts['verified_microscopic'] + counts['verified_uploaded']
+        })
 
-        # Count uploaded PDF reports (PatientReport model)
-        uploaded_reports = PatientReport.objects.filter(doctor=request.user)
-        pending_uploaded = uploaded_reports.filter(verified=False).count()
-        verified_uploaded = uploaded_reports.filter(verified=True).count()
 
-        # Total counts
-        total_pending = pending_microscopic + pending_uploaded
-        total_verified = verified_microscopic + verified_uploaded
+class SearchView(ReplicaReadMixin, generics.GenericAPIView):
+    # Ranked full-text search over the doctor's messages, their patients'
+    # microscopic reports and the patients themselves. ?q= is required;
+    # ?kind= (repeatable) narrows it. Pages by offset, since results are in
+    # rank order rather than a column cursor pagination could seek on.
+    permission_classes = (IsAuthenticated,)
+    serializer_class = SearchResultSerializer
 
+    def get(self, request):
+        if request.user.user_type != 'doctor':
+            return Response({"error": "Only doctors can access this endpoint"}, status=status.HTTP_403_FORBIDDEN)
+        params = request.query_params
+        kinds = [kind for kind in params.getlist('kind') if kind in dict(SearchDocument.KIND_CHOICES)]
+        try:
+            offset = max(0, int(params.get('offset', 0)))
+            page_size = min(max(1, int(params.get('page_size', settings.SEARCH_PAGE_SIZE))), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'detail': 'offset and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search.search(request.user.pk, params.get('q', ''), kinds, offset, page_size + 1)
+        url = request.build_absolute_uri()
+        previous = None
+        if offset:
+            previous = replace_query_param(url, 'offset', offset - page_size) if offset > page_size else \
+                remove_query_param(url, 'offset')
         return Response({
-            "pending_reports": total_pending,
-            "verified_reports": total_verified
+            'next': replace_query_param(url, 'offset', offset + page_size) if len(results) > page_size else None,
+            'previous': previous,
+            'results': self.get_serializer(results[:page_size], many=True).data,
         })
+
+
+class ExportView(ReplicaReadMixin, generics.GenericAPIView):
+    # GET /api/export/<kind>.<csv|ndjson>[?gzip=1] streams every row the
+    # user can see: doctors their patients' reports and their own uploads
+    # and messages, patients their own, staff everything (?doctor= narrows
+    # it). Memory use does not grow with the export.
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        model, _ = exporting.EXPORTS[self.kwargs['kind']]
+        user = self.request.user
+        if user.is_staff:
+            doctor = self.request.query_params.get('doctor')
+            if not doctor:
+                return model.objects.all()
+            if not doctor.isdigit():
+                raise Http404
+            return exporting.for_doctor(model.objects.all(), self.kwargs['kind'], doctor)
+        if model is Report:
+            return Report.objects.filter(report_access(user))
+        return model.objects.filter(**{'doctor' if user.user_type == 'doctor' else 'patient': user})
+
+    def get(self, request, kind, fmt):
+        if kind not in exporting.EXPORTS or fmt not in exporting.CONTENT_TYPES:
+            raise Http404
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        # Bound to a database now: the rows are read after this view returns,
+        # when the replica routing has been reset.
+        queryset = self.get_queryset()
+        chunks = exporting.export(queryset.using(router.db_for_read(queryset.model)), kind, fmt, compress)
+        if isinstance(request._request, ASGIRequest):
+            chunks = exporting.in_thread(chunks)
+        filename = f'{kind}.{fmt}.gz' if compress else f'{kind}.{fmt}'
+        response = StreamingHttpResponse(
+            chunks, content_type='application/gzip' if compress else exporting.CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'private, no-store'
+        return response